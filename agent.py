@@ -2,6 +2,7 @@
 from rag_engine import get_snippets
 from memory import ConversationMemory
 from textwrap import indent
+import metrics
 
 PROMPT_HEADER = """You are a senior system-design interviewer.
 When you answer:
@@ -28,15 +29,19 @@ class DesignAgent:
     def __init__(self, mem: ConversationMemory):
         self.mem = mem
 
-    def build_prompt(self, user_id: str, user_msg: str) -> str:
-        # 1. RAG
-        context = get_snippets(user_msg,2)
+    @metrics.timed("agent.build_prompt")
+    def build_prompt(self, user_id: str, user_msg: str, context: str = None) -> str:
+        # 1. RAG (skipped when the caller already retrieved, e.g. in batches)
+        if context is None:
+            with metrics.span("agent.retrieve"):
+                context = get_snippets(user_msg,2)
         # 2. Conversation history
-        hist_blocks = []
-        for m in self.mem.history(user_id):
-            tag = "Candidate" if m["role"] == "user" else "Interviewer"
-            hist_blocks.append(f"{tag}: {m['text']}")
-        history_text = indent("\n".join(hist_blocks), "  ")
+        with metrics.span("agent.history"):
+            hist_blocks = []
+            for m in self.mem.history(user_id):
+                tag = "Candidate" if m["role"] == "user" else "Interviewer"
+                hist_blocks.append(f"{tag}: {m['text']}")
+            history_text = indent("\n".join(hist_blocks), "  ")
         # 3. Assemble
         return PROMPT_HEADER.format(context=context) + PROMPT_FORMAT.format(
             history=history_text, candidate=user_msg
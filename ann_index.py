@@ -0,0 +1,118 @@
+# ann_index.py
+"""
+Approximate nearest-neighbour search (HNSW) for large corpora.
+
+Exact search in shared_index.py is one matrix-vector product over every
+chunk, which is fine for a few thousand chunks and too slow for millions.
+An HNSW graph answers the same query by visiting a few thousand nodes
+instead. It is stored as a sidecar file next to the index file
+(`index.idx.hnsw`), and labels are the row numbers of the index file, so
+chunk texts and metadata are still read from the memory-mapped file.
+
+Tuning (under `ann` in rag_parameters.json):
+    M                 graph degree; more = better recall, more memory
+    ef_construction   build-time beam width; more = better graph, slower build
+    ef_search         query-time beam width; the main recall/latency knob
+
+hnswlib is optional: it is only imported when an ANN index is built or
+loaded, and without it search stays exact.
+
+A loaded graph is not memory-mapped: hnswlib reads it, with a copy of every
+vector, into the process heap (`nbytes`). Each serve.py worker would hold
+its own copy, so workers search exactly unless `ann.multi_worker` is set.
+"""
+import numpy as np
+
+SIDECAR_SUFFIX = ".hnsw"
+
+
+def sidecar_path(index_path: str) -> str:
+    return index_path + SIDECAR_SUFFIX
+
+
+def _hnswlib():
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise ImportError("ANN search needs hnswlib: pip install hnswlib") from e
+    return hnswlib
+
+
+class HnswIndex:
+    """
+    Inner-product HNSW graph over L2-normalized vectors, so scores are cosine
+    similarities like the exact search. Vectors can be added in batches; the
+    capacity grows as needed.
+    """
+
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 200, ef_search: int = 64,
+                 capacity: int = 1024, _index=None):
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        if _index is None:
+            _index = _hnswlib().Index(space="ip", dim=dim)
+            _index.init_index(max_elements=max(capacity, 1), M=M, ef_construction=ef_construction)
+        self._index = _index
+        self.set_ef(ef_search)
+
+    @classmethod
+    def load(cls, path: str, dim: int, ef_search: int = 64):
+        index = _hnswlib().Index(space="ip", dim=dim)
+        index.load_index(path)
+        return cls(dim, index.M, index.ef_construction, ef_search, _index=index)
+
+    def set_ef(self, ef_search: int):
+        self.ef_search = ef_search
+        self._index.set_ef(ef_search)
+
+    def __len__(self):
+        return self._index.get_current_count()
+
+    def add(self, vectors, ids=None, num_threads: int = -1):
+        """Insert vectors (labels default to the next row numbers), growing the graph if needed."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if ids is None:
+            ids = np.arange(len(self), len(self) + len(vectors))
+        needed = len(self) + len(vectors)
+        capacity = self._index.get_max_elements()
+        if needed > capacity:
+            self._index.resize_index(max(needed, capacity * 2))
+        self._index.add_items(vectors, ids, num_threads=num_threads)
+
+    def search(self, vector, k: int = 4, filter=None) -> list:
+        """
+        Return [(label, score)] for the k nearest vectors; `filter(label)` limits candidates.
+        Raises RuntimeError when fewer than k candidates pass the filter.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        # ef below k would cap the result size
+        if self.ef_search < k:
+            self._index.set_ef(k)
+        try:
+            labels, distances = self._index.knn_query(np.asarray(vector, dtype=np.float32), k=k, filter=filter)
+        finally:
+            if self.ef_search < k:
+                self._index.set_ef(self.ef_search)
+        return [(int(label), 1.0 - float(dist)) for label, dist in zip(labels[0], distances[0])]
+
+    def save(self, path: str):
+        self._index.save_index(path)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the graph and its vector copies."""
+        per_element = self.dim * 4 + self.M * 2 * 4 + 8
+        return self._index.get_max_elements() * per_element
+
+
+def build_hnsw(vectors, M: int = 16, ef_construction: int = 200, ef_search: int = 64,
+               batch_size: int = 50000) -> HnswIndex:
+    """Build a graph over `vectors` (row i gets label i), inserting in batches."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    index = HnswIndex(vectors.shape[1], M, ef_construction, ef_search, capacity=len(vectors))
+    for start in range(0, len(vectors), batch_size):
+        index.add(vectors[start:start + batch_size])
+    return index
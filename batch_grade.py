@@ -0,0 +1,215 @@
+# batch_grade.py
+"""
+Grade many designs offline, without the MCP server or the Gradio UI.
+
+    python batch_grade.py designs.jsonl graded.jsonl --backend openai --model gpt-4o-mini --concurrency 16
+    python batch_grade.py designs.jsonl graded.jsonl --backend fake     # dry run, no API key
+
+Input: one JSON object per line with `topic`, `phase` and `answer` (and an
+optional `id`; the line number is used otherwise). Output: one JSON object
+per graded design, appended and flushed as soon as it is ready. Rerunning
+with the same output file skips every id that already has feedback, so an
+interrupted run resumes where it stopped and failed items are retried.
+
+Pipeline: designs are read in batches; each batch is embedded with one
+call and searched within its topic (rag_engine.get_snippets_batch), prompts
+are assembled with DesignAgent.build_prompt, and a fixed number of workers
+call the LLM backend. Retrieval for the next batch runs while the workers
+are busy, so throughput is bounded by the LLM.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import metrics
+from agent import DesignAgent
+from memory import ConversationMemory
+
+
+class FakeBackend:
+    """Deterministic offline backend (fake_llm.FakeLLM) for dry runs and load tests."""
+
+    def __init__(self, args):
+        from fake_llm import FakeLLM
+
+        self.model = "fake"
+        self.llm = FakeLLM(latency=args.fake_latency)
+
+    async def generate(self, prompt: str, max_tokens: int) -> str:
+        return await self.llm.generate(prompt, max_tokens)
+
+
+class OpenAIBackend:
+    """OpenAI chat completions; reads OPENAI_API_KEY (and OPENAI_BASE_URL) from the environment."""
+
+    def __init__(self, args):
+        from openai import AsyncOpenAI
+
+        self.model = args.model
+        self.client = AsyncOpenAI(max_retries=args.retries)
+
+    async def generate(self, prompt: str, max_tokens: int) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content
+
+
+BACKENDS = {"fake": FakeBackend, "openai": OpenAIBackend}
+
+
+def read_designs(path: str):
+    """Yield designs with an `id`, skipping blank lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            design = json.loads(line)
+            design.setdefault("id", f"line-{lineno}")
+            design["id"] = str(design["id"])
+            yield design
+
+
+def completed_ids(path: str) -> set:
+    """Ids that already have feedback in an output file (a torn last line is ignored)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "feedback" in record:
+                done.add(record["id"])
+    return done
+
+
+def batches(designs, size: int):
+    batch = []
+    for design in designs:
+        batch.append(design)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def candidate_message(design: dict) -> str:
+    return f"[Topic: {design['topic']} | Phase: {design['phase']}]\n{design['answer']}"
+
+
+def prepare_batch(agent: DesignAgent, batch: list, k: int) -> list:
+    """Retrieve context for a whole batch at once and assemble each prompt."""
+    from rag_engine import get_snippets_batch, resolve_topic
+
+    contexts = get_snippets_batch(
+        [d["answer"] for d in batch], k=k, topics=[resolve_topic(d["topic"]) for d in batch]
+    )
+    return [
+        (design, agent.build_prompt(design["id"], candidate_message(design), context=context))
+        for design, context in zip(batch, contexts)
+    ]
+
+
+class Grader:
+    def __init__(self, args):
+        self.args = args
+        self.backend = BACKENDS[args.backend](args)
+        self.agent = DesignAgent(ConversationMemory())
+        self.queue = asyncio.Queue(maxsize=args.concurrency * 2)
+        self.graded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.llm_seconds = []
+
+    def pending(self, done: set):
+        for design in read_designs(self.args.input):
+            if design["id"] in done:
+                self.skipped += 1
+                continue
+            yield design
+
+    async def produce(self, done: set):
+        loop = asyncio.get_running_loop()
+        for batch in batches(self.pending(done), self.args.batch_size):
+            # Retrieval is blocking (embedding model / index); keep it off the event loop
+            for item in await loop.run_in_executor(None, prepare_batch, self.agent, batch, self.args.k):
+                await self.queue.put(item)
+        for _ in range(self.args.concurrency):
+            await self.queue.put(None)
+
+    async def work(self, out):
+        while (item := await self.queue.get()) is not None:
+            design, prompt = item
+            record = {"id": design["id"], "topic": design["topic"], "phase": design["phase"],
+                      "backend": self.args.backend, "model": self.backend.model}
+            start = time.perf_counter()
+            try:
+                with metrics.span("batch.llm"):
+                    record["feedback"] = await asyncio.wait_for(
+                        self.backend.generate(prompt, self.args.max_tokens), self.args.timeout
+                    )
+                self.graded += 1
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                self.failed += 1
+            elapsed = time.perf_counter() - start
+            self.llm_seconds.append(elapsed)
+            record["latency_ms"] = round(elapsed * 1000, 1)
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    async def run(self) -> dict:
+        done = completed_ids(self.args.output)
+        Path(self.args.output).parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        with open(self.args.output, "a+", encoding="utf-8") as out:
+            # Start on a fresh line if the previous run died mid-write
+            if out.tell() and (out.seek(out.tell() - 1), out.read(1))[1] != "\n":
+                out.write("\n")
+            workers = [asyncio.create_task(self.work(out)) for _ in range(self.args.concurrency)]
+            await asyncio.gather(self.produce(done), *workers)
+        duration = time.perf_counter() - start
+        llm_ms = sorted(s * 1000 for s in self.llm_seconds)
+        return {
+            "graded": self.graded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "duration_s": round(duration, 2),
+            "throughput_per_s": round(len(llm_ms) / duration, 2) if duration else 0.0,
+            "llm_p50_ms": round(llm_ms[len(llm_ms) // 2], 1) if llm_ms else 0.0,
+            "llm_p95_ms": round(llm_ms[int(len(llm_ms) * 0.95)], 1) if llm_ms else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a JSONL file of designs offline")
+    parser.add_argument("input", help="JSONL with topic, phase, answer (and optional id) per line")
+    parser.add_argument("output", help="JSONL results; existing results are kept and skipped")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openai")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight")
+    parser.add_argument("--batch-size", type=int, default=64, help="designs embedded per retrieval call")
+    parser.add_argument("--k", type=int, default=2, help="context snippets per design")
+    parser.add_argument("--max-tokens", type=int, default=600)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per LLM call")
+    parser.add_argument("--retries", type=int, default=3, help="backend retries on transient errors")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="seconds per call for --backend fake")
+    args = parser.parse_args()
+
+    summary = asyncio.run(Grader(args).run())
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
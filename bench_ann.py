@@ -0,0 +1,133 @@
+# bench_ann.py
+"""
+Recall-vs-latency benchmark for the HNSW index (ann_index.py) against exact search.
+
+    python bench_ann.py                                   # 10k, 100k and 1M chunks
+    python bench_ann.py --sizes 10000 50000 --ef 16 64 256 --M 16 32
+
+The corpus is synthetic: unit vectors drawn around a few thousand random
+centres, like chunks that cluster by topic, in a low-dimensional latent
+space projected up to the dimension of the embedding model. Queries come
+from the same distribution. For every corpus size and graph setting it
+reports build time, graph memory, and for each ef_search the recall@k
+against exact search with p50/p95 query latency.
+Exact search latency at the same size is reported alongside. Results are
+written as JSON to bench_results/.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ann_index import build_hnsw
+
+
+class ClusteredCorpus:
+    """
+    Topic-like clusters in a low-dimensional latent space, projected up to the
+    embedding size. Sentence embeddings have low intrinsic dimension, and
+    isotropic noise in all 384 dimensions would make every neighbour search
+    unrealistically hard.
+    """
+
+    def __init__(self, dim: int, clusters: int, intrinsic_dim: int, spread: float, rng):
+        self.rng = rng
+        self.spread = spread
+        self.centres = rng.standard_normal((clusters, intrinsic_dim)).astype(np.float32)
+        self.projection = rng.standard_normal((intrinsic_dim, dim)).astype(np.float32) / np.sqrt(intrinsic_dim)
+
+    def sample(self, n: int) -> np.ndarray:
+        out = np.empty((n, self.projection.shape[1]), dtype=np.float32)
+        for start in range(0, n, 100000):
+            stop = min(n, start + 100000)
+            latent = self.centres[self.rng.integers(0, len(self.centres), stop - start)]
+            latent = latent + self.rng.standard_normal(latent.shape).astype(np.float32) * self.spread
+            rows = latent @ self.projection
+            out[start:stop] = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+        return out
+
+
+def exact_search(vectors: np.ndarray, queries: np.ndarray, k: int):
+    """Ground truth neighbours and per-query latency of the exact scan."""
+    truth, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        scores = vectors @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        latencies.append(time.perf_counter() - start)
+        truth.append(set(top.tolist()))
+    return truth, latencies
+
+
+def latency_summary(latencies: list) -> dict:
+    ms = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+    }
+
+
+def bench_size(n: int, args, rng) -> dict:
+    print(f"== {n} chunks, dim {args.dim}")
+    corpus = ClusteredCorpus(args.dim, args.clusters, args.intrinsic_dim, args.spread, rng)
+    vectors = corpus.sample(n)
+    queries = corpus.sample(args.queries)
+    truth, exact_latencies = exact_search(vectors, queries, args.k)
+    result = {"chunks": n, "exact": latency_summary(exact_latencies), "hnsw": []}
+    print(f"   exact            p50 {result['exact']['p50_ms']:8.3f}ms  p95 {result['exact']['p95_ms']:8.3f}ms")
+
+    for M in args.M:
+        start = time.perf_counter()
+        index = build_hnsw(vectors, M=M, ef_construction=args.ef_construction)
+        build_seconds = time.perf_counter() - start
+        setting = {"M": M, "ef_construction": args.ef_construction,
+                   "build_seconds": round(build_seconds, 2), "memory_mb": round(index.nbytes / 2**20, 1), "curve": []}
+        print(f"   M={M:<3} built in {build_seconds:.1f}s, ~{setting['memory_mb']} MB")
+        for ef in args.ef:
+            index.set_ef(ef)
+            hits, latencies = 0, []
+            for q, expected in zip(queries, truth):
+                start = time.perf_counter()
+                found = index.search(q, args.k)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected.intersection(label for label, _ in found))
+            point = {"ef_search": ef, "recall": round(hits / (args.k * len(queries)), 4), **latency_summary(latencies)}
+            setting["curve"].append(point)
+            print(f"     ef={ef:<4} recall@{args.k} {point['recall']:.3f}  "
+                  f"p50 {point['p50_ms']:8.3f}ms  p95 {point['p95_ms']:8.3f}ms")
+        result["hnsw"].append(setting)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HNSW recall vs latency at several corpus sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384, help="embedding size (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--intrinsic-dim", type=int, default=32, help="latent dimension of the clusters")
+    parser.add_argument("--spread", type=float, default=1.0, help="noise around each centre (latent units)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--M", type=int, nargs="+", default=[16])
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON result path (default bench_results/ann-<timestamp>.json)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "sizes": [bench_size(n, args, rng) for n in args.sizes],
+    }
+    output = Path(args.output or f"bench_results/ann-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
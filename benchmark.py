@@ -0,0 +1,279 @@
+# benchmark.py
+"""
+Load-testing harness for the MCP server.
+
+Drives server.py over stdio (spawned locally) or HTTP with a configurable
+number of concurrent virtual users, answers every ctx.sample with the
+deterministic FakeLLM so it runs offline, and reports throughput plus
+p50/p95/p99 latency per tool. Results are written as JSON so two runs can
+be compared with --compare.
+
+    python benchmark.py --workload all --concurrency 8 --requests 200
+    python benchmark.py --transport http --url http://127.0.0.1:8000/mcp/
+    python benchmark.py --compare bench_results/old.json bench_results/new.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from fastmcp import Client
+from fastmcp.client.transports import PythonStdioTransport, StreamableHttpTransport
+
+from fake_llm import FakeLLM
+
+RESULT_FORMAT_VERSION = 1
+WORKLOADS = ["cold_start", "repeated_topic", "unique_topics", "long_session"]
+
+with open("rag_parameters.json", "r") as f:
+    TOPICS = json.load(f)["topics"]
+
+DESIGN_TEMPLATE = (
+    "Design {topic}. Functional requirements: users can create, read and share items. "
+    "Non-functional: 99.9% availability, p99 latency under 200ms, 100M daily users. "
+    "Core entities: User, Item, Session. API: POST /items, GET /items/{{id}}. "
+    "Architecture: load balancer, stateless API servers, cache, sharded database. "
+    "Variant {n}."
+)
+
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def summarize(samples: list, errors: int, duration: float) -> dict:
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / duration, 3) if duration else 0.0,
+        "mean_ms": round(1000 * sum(samples) / len(samples), 3) if samples else 0.0,
+        "p50_ms": round(1000 * percentile(samples, 0.50), 3),
+        "p95_ms": round(1000 * percentile(samples, 0.95), 3),
+        "p99_ms": round(1000 * percentile(samples, 0.99), 3),
+        "max_ms": round(1000 * max(samples), 3) if samples else 0.0,
+    }
+
+
+class Recorder:
+    """Collects per-tool latency samples for one workload."""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, client: Client, tool: str, args: dict):
+        start = time.perf_counter()
+        try:
+            result = await client.call_tool(tool, args)
+        except Exception:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+            return None
+        self.samples.setdefault(tool, []).append(time.perf_counter() - start)
+        return result
+
+    def report(self, duration: float) -> dict:
+        tools = sorted(set(self.samples) | set(self.errors))
+        all_samples = [s for tool in tools for s in self.samples.get(tool, [])]
+        return {
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(len(all_samples) / duration, 3) if duration else 0.0,
+            "tools": {
+                tool: summarize(self.samples.get(tool, []), self.errors.get(tool, 0), duration)
+                for tool in tools
+            },
+        }
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.llm = FakeLLM(latency=args.llm_latency)
+
+    def make_client(self, user_id: str = None) -> Client:
+        if self.args.transport == "http":
+            # X-User-Id places the session on a serve.py worker; without it sessions go round-robin
+            headers = {"X-User-Id": user_id} if user_id else None
+            return Client(StreamableHttpTransport(self.args.url, headers=headers),
+                          sampling_handler=self.llm.sampling_handler)
+        transport = PythonStdioTransport(
+            script_path=self.args.server,
+            cwd=str(Path(self.args.server).resolve().parent),
+            python_cmd=sys.executable,
+        )
+        return Client(transport, sampling_handler=self.llm.sampling_handler)
+
+    async def _run_users(self, recorder: Recorder, user_fn) -> float:
+        """Run `concurrency` virtual users. Stdio shares one session (one server
+        process), HTTP gives every user its own connection."""
+        concurrency = self.args.concurrency
+        start = time.perf_counter()
+        if self.args.transport == "http":
+            async def user(i):
+                async with self.make_client(f"vu-{i}") as client:
+                    await user_fn(client, i)
+            await asyncio.gather(*(user(i) for i in range(concurrency)))
+        else:
+            async with self.make_client() as client:
+                start = time.perf_counter()
+                await asyncio.gather(*(user_fn(client, i) for i in range(concurrency)))
+        return time.perf_counter() - start
+
+    def _per_user(self) -> int:
+        return max(1, self.args.requests // self.args.concurrency)
+
+    async def cold_start(self) -> dict:
+        """Time from spawning/connecting to the first answered tool call."""
+        recorder = Recorder()
+        start = time.perf_counter()
+        for n in range(self.args.cold_starts):
+            t0 = time.perf_counter()
+            async with self.make_client(f"cold-{n}") as client:
+                recorder.samples.setdefault("connect", []).append(time.perf_counter() - t0)
+                await recorder.call(client, "get_rag_context",
+                                    {"user_id": f"cold-{n}", "system_design": DESIGN_TEMPLATE.format(topic=TOPICS[0], n=n)})
+            recorder.samples.setdefault("first_response", []).append(time.perf_counter() - t0)
+        return recorder.report(time.perf_counter() - start)
+
+    async def repeated_topic(self) -> dict:
+        """Every user asks about the same design, over and over."""
+        recorder = Recorder()
+        design = DESIGN_TEMPLATE.format(topic=TOPICS[0], n=0)
+
+        async def user_fn(client, i):
+            for _ in range(self._per_user()):
+                await recorder.call(client, "get_rag_context", {"user_id": f"rep-{i}", "system_design": design})
+                await recorder.call(client, "design_feedback", {"user_id": f"rep-{i}", "system_design": design})
+
+        return recorder.report(await self._run_users(recorder, user_fn))
+
+    async def unique_topics(self) -> dict:
+        """Every request carries a design text the server has never seen."""
+        recorder = Recorder()
+
+        async def user_fn(client, i):
+            for j in range(self._per_user()):
+                design = DESIGN_TEMPLATE.format(topic=TOPICS[(i + j) % len(TOPICS)], n=f"{i}-{j}")
+                await recorder.call(client, "get_rag_context", {"user_id": f"uniq-{i}-{j}", "system_design": design})
+                await recorder.call(client, "design_feedback", {"user_id": f"uniq-{i}-{j}", "system_design": design})
+
+        return recorder.report(await self._run_users(recorder, user_fn))
+
+    async def long_session(self) -> dict:
+        """Each user keeps one user_id for many turns so server memory fills up."""
+        recorder = Recorder()
+
+        async def user_fn(client, i):
+            topic = TOPICS[i % len(TOPICS)]
+            for turn in range(self.args.session_turns):
+                design = DESIGN_TEMPLATE.format(topic=topic, n=f"turn {turn}")
+                await recorder.call(client, "design_feedback", {"user_id": f"long-{i}", "system_design": design})
+
+        return recorder.report(await self._run_users(recorder, user_fn))
+
+    async def server_metrics(self) -> dict:
+        """Per-stage breakdown from the server's own metrics registry, when reachable."""
+        if self.args.transport != "http":
+            return {}
+        try:
+            async with self.make_client() as client:
+                result = await client.call_tool("get_metrics", {"format": "json"})
+                return json.loads(result[0].text)
+        except Exception:
+            return {}
+
+    async def run(self) -> dict:
+        selected = WORKLOADS if self.args.workload == "all" else [self.args.workload]
+        results = {}
+        for name in selected:
+            print(f"▶︎ {name} ...", file=sys.stderr)
+            results[name] = await getattr(self, name)()
+        return {
+            "format_version": RESULT_FORMAT_VERSION,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": _git_rev(),
+            "config": {
+                "transport": self.args.transport,
+                "concurrency": self.args.concurrency,
+                "requests": self.args.requests,
+                "session_turns": self.args.session_turns,
+                "llm_latency": self.args.llm_latency,
+            },
+            "workloads": results,
+            "server_stages": (await self.server_metrics()).get("stages", {}),
+        }
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def print_report(result: dict):
+    for name, workload in result["workloads"].items():
+        print(f"\n== {name}  ({workload['throughput_rps']} req/s over {workload['duration_s']}s)")
+        print(f"{'tool':<24}{'count':>7}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for tool, s in workload["tools"].items():
+            print(f"{tool:<24}{s['count']:>7}{s['errors']:>5}{s['throughput_rps']:>9}"
+                  f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def compare(old_path: str, new_path: str, tolerance: float) -> int:
+    """Print p95 deltas per workload/tool; return 1 if anything regressed past tolerance."""
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    regressed = False
+    print(f"{'workload/tool':<40}{'old p95':>10}{'new p95':>10}{'delta':>9}")
+    for name, workload in new["workloads"].items():
+        for tool, s in workload["tools"].items():
+            before = old.get("workloads", {}).get(name, {}).get("tools", {}).get(tool)
+            if not before or not before["p95_ms"]:
+                continue
+            delta = (s["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+            flag = ""
+            if delta > tolerance:
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"{name + '/' + tool:<40}{before['p95_ms']:>10}{s['p95_ms']:>10}{delta:>+9.1%}{flag}")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the system-design MCP server")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    parser.add_argument("--server", default="server.py", help="server script for the stdio transport")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/mcp/", help="server URL for the http transport")
+    parser.add_argument("--workload", choices=WORKLOADS + ["all"], default="all")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=40, help="requests per workload, split across users")
+    parser.add_argument("--session-turns", type=int, default=15, help="turns per user in long_session")
+    parser.add_argument("--cold-starts", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake LLM waits per sample")
+    parser.add_argument("--output", help="JSON result path (default bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95 growth for --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.tolerance))
+
+    result = asyncio.run(Harness(args).run())
+    print_report(result)
+    output = Path(args.output or f"bench_results/{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(output.parent, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
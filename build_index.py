@@ -0,0 +1,172 @@
+# build_index.py
+"""
+Offline index builds with versioned, immutable artifacts.
+
+    python build_index.py build [--refresh] [--activate]   # fetch -> extract -> chunk -> embed
+    python build_index.py list
+    python build_index.py activate <version>               # switch (or roll back) running servers
+    python build_index.py prune --keep 5
+
+Each build writes indexes/<version>/ with the memory-mapped index file
+(shared_index.py format) and a manifest.json describing it. The directory
+is written under a temporary name and renamed when complete, then made
+read-only. indexes/CURRENT names the active version and is replaced
+atomically; running servers watch it and swap to the new index without a
+restart, while queries already in flight finish on the old one.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import time
+from pathlib import Path
+
+# Load parameters globally
+with open("parameters.json", "r") as f:
+    _index_params = json.load(f).get("index", {})
+
+INDEX_DIR = Path(_index_params.get("dir", "indexes"))
+INDEX_FILE = "index.idx"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+MANIFEST_VERSION = 1
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_dir(version: str) -> Path:
+    return INDEX_DIR / version
+
+
+def list_versions() -> list:
+    """Completed artifact versions, oldest first."""
+    if not INDEX_DIR.exists():
+        return []
+    return sorted(p.name for p in INDEX_DIR.iterdir()
+                  if p.is_dir() and not p.name.startswith(".") and (p / MANIFEST_FILE).exists())
+
+
+def read_manifest(version: str) -> dict:
+    return json.loads((artifact_dir(version) / MANIFEST_FILE).read_text(encoding="utf-8"))
+
+
+def current_version():
+    try:
+        return (INDEX_DIR / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(version: str):
+    """Point CURRENT at `version` atomically (write a temp file, then rename over)."""
+    if version not in list_versions():
+        raise ValueError(f"Unknown index version: {version}")
+    tmp = INDEX_DIR / f".{CURRENT_FILE}.tmp"
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, INDEX_DIR / CURRENT_FILE)
+
+
+def build(refresh: bool = False, activate: bool = False) -> dict:
+    """Run the offline pipeline into a new immutable artifact and return its manifest."""
+    import rag_engine
+
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    started = time.time()
+    staging = INDEX_DIR / f".building-{os.getpid()}-{int(started)}"
+    staging.mkdir()
+    try:
+        report = rag_engine.export_shared_index(str(staging / INDEX_FILE), refresh=refresh)
+        files = {path.name: _sha256(path) for path in sorted(staging.iterdir())}
+        index_hash = files[INDEX_FILE]
+        version = time.strftime("%Y%m%d-%H%M%S", time.localtime(started)) + "-" + index_hash[:8]
+        manifest = {
+            "manifest_version": MANIFEST_VERSION,
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "build_seconds": round(time.time() - started, 3),
+            "embed_model": rag_engine.EMBED_MODEL,
+            "topics": list(rag_engine.params["topics"]),
+            "sources": {
+                topic: _sha256(Path(f"documents/{topic}.txt"))
+                for topic in rag_engine.params["topics"] if Path(f"documents/{topic}.txt").exists()
+            },
+            "chunks": report["chunks_after"],
+            "build_report": report,
+            "ann": report.get("ann"),
+            "files": files,
+        }
+        (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        for path in staging.iterdir():
+            path.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.rename(staging, artifact_dir(version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate or current_version() is None:
+        set_current(version)
+    return manifest
+
+
+def prune(keep: int) -> list:
+    """Delete the oldest artifacts beyond `keep`, never the current one."""
+    current = current_version()
+    versions = list_versions()
+    removed = []
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version == current:
+            continue
+        path = artifact_dir(version)
+        for child in path.iterdir():
+            child.chmod(stat.S_IRUSR | stat.S_IWUSR)
+        shutil.rmtree(path)
+        removed.append(version)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and manage versioned RAG index artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bp = sub.add_parser("build", help="fetch, chunk and embed the corpus into a new artifact")
+    bp.add_argument("--refresh", action="store_true", help="re-fetch topic pages even if documents/ has them")
+    bp.add_argument("--activate", action="store_true", help="make the new artifact CURRENT")
+    sub.add_parser("list", help="list artifacts")
+    ap = sub.add_parser("activate", help="point CURRENT at a version (also used for rollback)")
+    ap.add_argument("version")
+    pp = sub.add_parser("prune", help="delete old artifacts")
+    pp.add_argument("--keep", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        manifest = build(args.refresh, args.activate)
+        active = " (active)" if current_version() == manifest["version"] else ""
+        print(f"built {manifest['version']}{active}: {manifest['chunks']} chunks in {manifest['build_seconds']}s")
+    elif args.command == "list":
+        current = current_version()
+        for version in list_versions():
+            manifest = read_manifest(version)
+            marker = "*" if version == current else " "
+            print(f"{marker} {version}  {manifest['chunks']:>7} chunks  {manifest['embed_model']}")
+    elif args.command == "activate":
+        try:
+            set_current(args.version)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        print(f"CURRENT -> {args.version}")
+    elif args.command == "prune":
+        for version in prune(args.keep):
+            print(f"removed {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# check_import_time.py
+"""
+Startup budget check for the MCP server.
+
+Imports the server module in a fresh interpreter with `-X importtime`,
+then fails (exit code 1) when the total import time exceeds the budget or
+when a heavy dependency that should load lazily shows up at startup.
+
+    python check_import_time.py                 # budget from parameters.json
+    python check_import_time.py --budget-ms 800 --runs 5 --top 15
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# Load parameters globally
+with open("parameters.json", "r") as f:
+    _budget_params = json.load(f).get("import_budget", {})
+
+
+def measure(module: str) -> list:
+    """Return [(self_us, cumulative_us, depth, name)] for one cold import of `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when server startup imports regress")
+    parser.add_argument("--module", default=_budget_params.get("module", "server"))
+    parser.add_argument("--budget-ms", type=float, default=_budget_params.get("budget_ms", 1500))
+    parser.add_argument("--runs", type=int, default=3, help="best of N cold runs is compared to the budget")
+    parser.add_argument("--top", type=int, default=10, help="how many of the slowest direct imports to list")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        rows = measure(args.module)
+        total_us = sum(cum for _, cum, depth, _ in rows if depth == 0)
+        if best is None or total_us < best[0]:
+            best = (total_us, rows)
+    total_us, rows = best
+
+    print(f"import {args.module}: {total_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+    # Depth 1 = what the measured module imports directly
+    direct = sorted((r for r in rows if r[2] == 1), key=lambda r: -r[1])[:args.top]
+    for _, cum, _, name in direct:
+        print(f"  {cum / 1000:8.1f} ms  {name}")
+
+    failed = False
+    loaded = {name.split(".")[0] for _, _, _, name in rows}
+    eager = [m for m in _budget_params.get("forbidden", []) if m in loaded]
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total_us / 1000 > args.budget_ms:
+        print(f"FAIL: startup imports take {total_us / 1000:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
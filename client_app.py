@@ -4,12 +4,40 @@ from mcp_agent.app import MCPApp
 from mcp_agent.agents.agent import Agent
 from mcp_agent.workflows.llm.augmented_llm_openai import OpenAIAugmentedLLM
 from agent_state import get_agent_state
+from mcp_agent.workflows.llm.augmented_llm import RequestParams
+from transcript import Transcript
+import hashlib
+import json
 import uuid
 
+# Messages shown in the conversation panel; older ones sit behind "Show earlier"
+TRANSCRIPT_WINDOW = 20
+
+# Submissions allowed in a phase before "Next" stops waiting for the rubric to say "advance"
+PHASE_GATE_ATTEMPTS = 2
+
+# Token caps for the map (one critique per phase) and reduce (final grade) steps of the final evaluation
+CRITIQUE_MAX_TOKENS = 400
+FINAL_MAX_TOKENS = 900
+
 def write_to_file(content, filename='output.txt'):
     with open(filename, 'a') as f:
         f.write(content + '\n')
 
+def _prompt_text(result) -> str:
+    """Text of an MCP GetPromptResult."""
+    messages = getattr(result, "messages", None)
+    if not messages:
+        return str(result)
+    return "\n".join(getattr(m.content, "text", str(m.content)) for m in messages)
+
+def _tool_text(result) -> str:
+    """Text of an MCP CallToolResult."""
+    content = getattr(result, "content", None)
+    if not content:
+        return str(result)
+    return "\n".join(getattr(c, "text", "") for c in content)
+
 def _dump(label: str, agent):
     try:
         loop_now = asyncio.get_running_loop()
@@ -36,9 +64,17 @@ class SystemDesignInterviewer:
         self.current_phase = 0
         self.system_design_topic = ""
         self.user_id = str(uuid.uuid4())
-        self.conversation_history = []
+        self.conversation_history = Transcript(window=TRANSCRIPT_WINDOW)
         self.interview_started = False
         self.initialized = False
+        self.phase_scores = {}      # phase index -> latest local rubric result
+        self.phase_attempts = {}    # phase index -> number of submissions
+        # Phase prompt + RAG context, loaded in the background ahead of the first submission
+        self._materials = {}        # phase index -> asyncio.Task
+        self._speculative = set()   # prefetched phases nobody has asked for yet
+        self.prefetch_stats = {"hits": 0, "misses": 0, "cancelled": 0}
+        # Per-phase critiques for the final evaluation: phase index -> (hash of the phase's messages, task)
+        self._critiques = {}
         
         # Interview phases in order
         self.phases = [
@@ -120,31 +156,266 @@ class SystemDesignInterviewer:
         
         return f"{rag_context}\n\n{phase_prompt}"
     
+    async def load_phase_material(self, phase_index: int) -> dict:
+        """Fetch a phase's evaluation prompt and its topic-filtered RAG context concurrently."""
+        phase = self.phases[phase_index]
+        prompt_result, rag_result = await asyncio.gather(
+            self.agent.get_prompt(phase["prompt"], {"system_design": self.system_design_topic}),
+            self.agent.call_tool(
+                "get_rag_context",
+                {
+                    "user_id": self.user_id,
+                    "system_design": f"{self.system_design_topic} {phase['name']}",
+                    "topic": self.system_design_topic
+                }
+            ),
+        )
+        return {"prompt": _prompt_text(prompt_result), "context": _tool_text(rag_result)}
+
+    def prefetch_phase(self, phase_index: int):
+        """Start loading a phase's material in the background unless it is cached or loading already."""
+        if not 0 <= phase_index < len(self.phases) or phase_index in self._materials:
+            return
+        task = asyncio.create_task(self.load_phase_material(phase_index))
+        # Nobody may ever await a speculative load; retrieve its error so asyncio does not warn
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._materials[phase_index] = task
+        self._speculative.add(phase_index)
+
+    def cancel_prefetch(self, keep: int = None):
+        """Cancel speculative loads still running for any phase other than `keep`."""
+        for index in list(self._speculative):
+            task = self._materials[index]
+            if index != keep and not task.done():
+                task.cancel()
+                del self._materials[index]
+                self._speculative.discard(index)
+                self.prefetch_stats["cancelled"] += 1
+
+    def reset_prefetch(self):
+        self.cancel_prefetch()
+        self._materials = {}
+        self._speculative = set()
+
+    async def phase_material(self, phase_index: int, count: bool = True) -> dict:
+        """
+        A phase's prompt and RAG context. The first request after a prefetch
+        counts as a hit (even if the load is still finishing); loading it here
+        on demand counts as a miss. Later requests reuse the cached result.
+        Background readers (phase critiques) pass count=False so they neither
+        skew prefetch_stats nor use up a pending prefetch hit.
+        """
+        task = self._materials.get(phase_index)
+        if count and phase_index in self._speculative:
+            self._speculative.discard(phase_index)
+            self.prefetch_stats["hits"] += 1
+        elif task is None:
+            if count:
+                self.prefetch_stats["misses"] += 1
+            task = self._materials[phase_index] = asyncio.create_task(self.load_phase_material(phase_index))
+        try:
+            return await task
+        except Exception:
+            # Do not cache a failure; the next submission loads again
+            self._materials.pop(phase_index, None)
+            raise
+
+    def prefetch_hit_rate(self):
+        used = self.prefetch_stats["hits"] + self.prefetch_stats["misses"]
+        return self.prefetch_stats["hits"] / used if used else None
+
+    def add_message(self, role: str, content: str, phase: int = None):
+        """Append to the transcript, tagged with the phase it belongs to."""
+        self.conversation_history.append({
+            "role": role,
+            "content": content,
+            "phase": self.current_phase if phase is None else phase
+        })
+
+    def phase_slice(self, phase_index: int) -> list:
+        return [m for m in self.conversation_history if m.get("phase") == phase_index]
+
+    def start_critique(self, phase_index: int):
+        """
+        Critique a phase's slice of the conversation in the background, unless
+        the same slice was already critiqued. Returns the task, or None when
+        the candidate never answered in that phase.
+        """
+        messages = self.phase_slice(phase_index)
+        if not any(m["role"] == "user" for m in messages):
+            return None
+        key = hashlib.sha256(
+            json.dumps([self.system_design_topic, messages], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        cached = self._critiques.get(phase_index)
+        if cached and cached[0] == key:
+            task = cached[1]
+            # Reuse unless it failed; a failed critique is retried
+            if not task.done() or (not task.cancelled() and task.exception() is None):
+                return task
+        task = asyncio.create_task(self.critique_phase(phase_index, messages))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._critiques[phase_index] = (key, task)
+        return task
+
+    def reset_critiques(self):
+        for _, task in self._critiques.values():
+            task.cancel()
+        self._critiques = {}
+
+    async def critique_phase(self, phase_index: int, messages: list) -> str:
+        """Map step: a short, history-free critique of one phase."""
+        phase = self.phases[phase_index]
+        material = await self.phase_material(phase_index, count=False)
+        transcript = "\n".join(
+            f"{'Candidate' if m['role'] == 'user' else 'Interviewer'}: {m['content']}" for m in messages
+        )
+        prompt = f"""
+        You are reviewing one phase of a system design interview.
+        System design topic: {self.system_design_topic}
+        Phase: {phase['name']}
+
+        Evaluation criteria:
+        {material['prompt']}
+
+        Transcript of this phase:
+        {transcript}
+
+        Write a short critique (at most 120 words): strengths, gaps, and a score out of 10 for this phase.
+        IMPORTANT: Provide your critique directly as text. Do not use any tools or request human input.
+        """
+        return await self.llm.generate_str(
+            message=prompt,
+            request_params=RequestParams(use_history=False, maxTokens=CRITIQUE_MAX_TOKENS)
+        )
+
+    async def final_evaluation(self, user_response: str) -> str:
+        """
+        Map-reduce final evaluation. Critiques of the earlier phases run
+        concurrently; most were already produced in the background when each
+        phase was completed. One short reduce call turns them into the grade.
+        """
+        final_index = len(self.phases) - 1
+        tasks = {i: self.start_critique(i) for i in range(final_index)}
+        tasks = {i: t for i, t in tasks.items() if t is not None}
+        material, *critiques = await asyncio.gather(
+            self.phase_material(final_index), *tasks.values(), return_exceptions=True
+        )
+        if isinstance(material, BaseException):
+            raise material
+
+        sections = []
+        for i, critique in zip(tasks, critiques):
+            if isinstance(critique, BaseException):
+                critique = f"(critique unavailable: {critique})"
+            sections.append(f"### {self.phases[i]['name']}\n{critique}")
+        skipped = [self.phases[i]["name"] for i in range(final_index) if i not in tasks]
+        if skipped:
+            sections.append(f"### Not answered\n{', '.join(skipped)}")
+        critiques_text = "\n\n".join(sections)
+
+        prompt = f"""
+        You are giving the final evaluation of a system design interview.
+        System design topic: {self.system_design_topic}
+
+        Evaluation criteria:
+        {material['prompt']}
+
+        Critiques of each phase:
+        {critiques_text}
+
+        Candidate's closing remarks: {user_response}
+
+        Merge the critiques into an overall grade with a short justification, the main strengths,
+        the most important improvements, and key learning points. Do not repeat the critiques verbatim.
+        IMPORTANT: Provide your evaluation directly as text. Do not use any tools or request human input.
+        """
+        return await self.llm.generate_str(
+            message=prompt,
+            request_params=RequestParams(use_history=False, maxTokens=FINAL_MAX_TOKENS)
+        )
+
+    async def score_response(self, user_response: str):
+        """Score the response with the server's local rubric (no LLM call). None if unavailable."""
+        current_phase_info = self.phases[self.current_phase]
+        try:
+            result = await self.agent.call_tool(
+                "score_design",
+                {
+                    "topic": self.system_design_topic,
+                    "phase": current_phase_info["prompt"],
+                    "answer": user_response
+                }
+            )
+            score = json.loads(result.content[0].text)
+        except Exception as e:
+            print(f"Rubric scoring failed: {e}")
+            return None
+        if "error" in score:
+            return None
+        self.phase_scores[self.current_phase] = score
+        return score
+
+    def can_advance(self) -> tuple[bool, str]:
+        """
+        Gate for "Next": the rubric must say "advance", unless the candidate already
+        tried enough times. A phase with no answer yet is never ready; one whose
+        answers could not be scored (scorer unavailable) does not block.
+        """
+        score = self.phase_scores.get(self.current_phase)
+        attempts = self.phase_attempts.get(self.current_phase, 0)
+        if attempts == 0:
+            return False, "an answer for this phase"
+        if score is None or score["verdict"] == "advance" or attempts >= PHASE_GATE_ATTEMPTS:
+            return True, ""
+        return False, ", ".join(score["missing_items"]) or "more detail"
+
     async def evaluate_response(self, user_response: str) -> str:
         """Evaluate user's response for current phase"""
         current_phase_info = self.phases[self.current_phase]
+        self.phase_attempts[self.current_phase] = self.phase_attempts.get(self.current_phase, 0) + 1
+        if self.current_phase == len(self.phases) - 1:
+            return await self.final_evaluation(user_response)
         
-        # Get RAG context for the user's response
-        
-        phase_prompt = await self.agent.get_prompt(
-            f"{current_phase_info['name']}",
-            {"system_design": self.system_design_topic}
+        # Phase prompt + RAG context (usually prefetched) and the local rubric score, concurrently
+        material, score = await asyncio.gather(
+            self.phase_material(self.current_phase),
+            self.score_response(user_response)
         )
+        if score is not None and score["verdict"] == "advance":
+            # The candidate will probably click "Next": warm the next phase while the feedback is written
+            self.prefetch_phase(self.current_phase + 1)
+
+        # The local rubric decides between next phase / improvements / hints,
+        # so the LLM only has to write the feedback
+        if score is None:
+            decision = """Then, determine if we should:
+        1. Move to next phase
+        2. Ask for improvements
+        3. Provide hints"""
+        else:
+            action = {
+                "advance": "Tell the candidate the answer is good enough to move to the next phase.",
+                "improve": "Ask the candidate to improve the answer.",
+                "hint": "Give the candidate hints without revealing the answer.",
+            }[score["verdict"]]
+            decision = f"""A rubric check already scored this answer {score['score']:.2f}/1.
+        Missing items: {", ".join(score["missing_items"]) or "none"}.
+        Missing key terms: {", ".join(score["missing_terms"]) or "none"}.
+        {action} Focus your feedback on the missing items."""
 
         evaluation_prompt = f"""
         Based on the {current_phase_info['name']} phase evaluation criteria,
         please evaluate this response: {user_response} based on requirement of criteria:
-        {phase_prompt}.
+        {material['prompt']}.
 
         You should refer to similar system's respond answers to review user's answer and provide insights.
-        Use get_rag_context tool to get similar system's respond answers.
+        Similar system's respond answers:
+        {material['context']}
         
         System design topic: {self.system_design_topic}
 
-        Then, determine if we should:
-        1. Move to next phase
-        2. Ask for improvements
-        3. Provide hints
+        {decision}
         
         IMPORTANT: Provide your evaluation directly as text. Do not use any tools or request human input.
         """
@@ -202,7 +473,7 @@ async def initialize_system():
     except Exception as e:
         return f"❌ Initialization failed: {str(e)}"
 
-def start_interview(topic: str):
+async def start_interview(topic: str):
     """Start a new interview with the given topic"""
     global interviewer
     if not interviewer.initialized:
@@ -214,14 +485,17 @@ def start_interview(topic: str):
     interviewer.system_design_topic = topic
     interviewer.interview_started = True
     interviewer.current_phase = 0
-    interviewer.conversation_history = []
+    interviewer.conversation_history.clear()
+    interviewer.phase_scores = {}
+    interviewer.phase_attempts = {}
+    # Material cached for the previous topic is useless now; start on phase 0 while the candidate reads
+    interviewer.reset_prefetch()
+    interviewer.reset_critiques()
+    interviewer.prefetch_phase(0)
     
     # Add initial message
     initial_message = f"Welcome! Today we'll design: {topic}. {interviewer.phases[0]['instruction']}"
-    interviewer.conversation_history.append({
-        "role": "interviewer",
-        "content": initial_message
-    })
+    interviewer.add_message("interviewer", initial_message)
     
     # Format conversation for display
     conversation = format_conversation(interviewer.conversation_history)
@@ -231,31 +505,32 @@ def start_interview(topic: str):
     return "✅ Interview started!", conversation, progress, current_phase['name']
 
 def format_conversation(history):
-    """Format conversation history for display"""
-    formatted = ""
-    for msg in history:
-        if msg["role"] == "interviewer":
-            formatted += f"🤖 **Interviewer:** {msg['content']}\n\n"
-        else:
-            formatted += f"👤 **You:** {msg['content']}\n\n"
-    return formatted
+    """Format conversation history for display (only the cached fragments of the visible window)"""
+    return history.render()
+
+def show_earlier_messages():
+    """Reveal one more page of older messages"""
+    global interviewer
+    interviewer.conversation_history.show_earlier()
+    return format_conversation(interviewer.conversation_history)
 
-async def submit_response(user_input: str, conversation_history: str):
+async def submit_response(user_input: str):
     """Submit user response and get feedback"""
     global interviewer
     
+    # gr.update() leaves the conversation panel untouched instead of resending it
     if not interviewer.interview_started:
-        return "❌ Please start an interview first!", conversation_history, 0, "Not Started"
+        return "❌ Please start an interview first!", gr.update(), 0, "Not Started"
     
     if not user_input.strip():
-        return "❌ Please enter a response!", conversation_history, 0, interviewer.phases[interviewer.current_phase]['name']
+        return "❌ Please enter a response!", gr.update(), 0, interviewer.phases[interviewer.current_phase]['name']
     
     try:
+        # Jump back to the latest messages
+        interviewer.conversation_history.reset_window()
         # Add user message to history
-        interviewer.conversation_history.append({
-            "role": "user",
-            "content": user_input
-        })
+        phase = interviewer.current_phase
+        interviewer.add_message("user", user_input)
         
         # Get feedback asynchronously
         async def get_feedback():
@@ -264,30 +539,31 @@ async def submit_response(user_input: str, conversation_history: str):
         feedback = await get_feedback()
         
         # Add interviewer response to history
-        interviewer.conversation_history.append({
-            "role": "interviewer",
-            "content": feedback
-        })
+        interviewer.add_message("interviewer", feedback, phase)
         
         # Format conversation for display
         conversation = format_conversation(interviewer.conversation_history)
         current_phase = interviewer.phases[interviewer.current_phase]
         progress = (interviewer.current_phase + 1) / len(interviewer.phases)
         
-        return "✅ Response processed!", conversation, progress, current_phase['name']
+        status = "✅ Response processed!"
+        score = interviewer.phase_scores.get(interviewer.current_phase)
+        if score is not None:
+            status += f" Rubric score {score['score']:.2f} ({score['verdict']})"
+        hit_rate = interviewer.prefetch_hit_rate()
+        if hit_rate is not None:
+            status += f" · prefetch hit rate {hit_rate:.0%}"
+        return status, conversation, progress, current_phase['name']
         
     except Exception as e:
         error_msg = f"❌ Error processing response: {str(e)}"
-        interviewer.conversation_history.append({
-            "role": "interviewer",
-            "content": "I apologize, but I encountered an error processing your response. Please try again."
-        })
+        interviewer.add_message("interviewer", "I apologize, but I encountered an error processing your response. Please try again.")
         conversation = format_conversation(interviewer.conversation_history)
         current_phase = interviewer.phases[interviewer.current_phase]
         progress = (interviewer.current_phase + 1) / len(interviewer.phases)
         return error_msg, conversation, progress, current_phase['name']
 
-def navigate_phase(direction: str):
+async def navigate_phase(direction: str):
     """Navigate to previous or next phase"""
     global interviewer
     
@@ -297,13 +573,23 @@ def navigate_phase(direction: str):
     if direction == "previous" and interviewer.current_phase > 0:
         interviewer.current_phase -= 1
     elif direction == "next" and interviewer.current_phase < len(interviewer.phases) - 1:
+        ready, missing = interviewer.can_advance()
+        if not ready:
+            conversation = format_conversation(interviewer.conversation_history)
+            current_phase = interviewer.phases[interviewer.current_phase]
+            progress = (interviewer.current_phase + 1) / len(interviewer.phases)
+            return f"⚠️ Not ready for the next phase yet. Missing: {missing}", conversation, progress, current_phase['name']
+        # The phase is done: critique it now so the final evaluation only has to merge
+        interviewer.start_critique(interviewer.current_phase)
         interviewer.current_phase += 1
         # Add phase instruction to conversation
         current_phase = interviewer.phases[interviewer.current_phase]
-        interviewer.conversation_history.append({
-            "role": "interviewer",
-            "content": current_phase['instruction']
-        })
+        interviewer.conversation_history.reset_window()
+        interviewer.add_message("interviewer", current_phase['instruction'])
+
+    # Only the phase we landed on is worth loading now
+    interviewer.cancel_prefetch(keep=interviewer.current_phase)
+    interviewer.prefetch_phase(interviewer.current_phase)
     
     conversation = format_conversation(interviewer.conversation_history)
     current_phase = interviewer.phases[interviewer.current_phase]
@@ -311,6 +597,12 @@ def navigate_phase(direction: str):
     
     return f"✅ Moved to {current_phase['name']} phase", conversation, progress, current_phase['name']
 
+async def previous_phase():
+    return await navigate_phase("previous")
+
+async def next_phase():
+    return await navigate_phase("next")
+
 def create_interface():
     """Create the Gradio interface"""
     with gr.Blocks(title="System Design Interview Assistant", theme=gr.themes.Soft()) as demo:
@@ -378,6 +670,7 @@ def create_interface():
                 gr.Markdown("## 💬 Interview Conversation")
                 
                 # Conversation display
+                show_earlier_btn = gr.Button("⬆️ Show earlier messages", size="sm")
                 conversation_display = gr.Markdown(
                     value="*Interview conversation will appear here...*",
                     height=400
@@ -405,7 +698,7 @@ def create_interface():
         
         submit_btn.click(
             fn=submit_response,
-            inputs=[user_input, conversation_display],
+            inputs=[user_input],
             outputs=[status_display, conversation_display, progress_bar, current_phase_display]
         ).then(
             fn=lambda: "",  # Clear input after submission
@@ -414,7 +707,7 @@ def create_interface():
         
         user_input.submit(  # Allow Enter key to submit
             fn=submit_response,
-            inputs=[user_input, conversation_display],
+            inputs=[user_input],
             outputs=[status_display, conversation_display, progress_bar, current_phase_display]
         ).then(
             fn=lambda: "",
@@ -422,14 +715,19 @@ def create_interface():
         )
         
         prev_btn.click(
-            fn=lambda: navigate_phase("previous"),
+            fn=previous_phase,
             outputs=[status_display, conversation_display, progress_bar, current_phase_display]
         )
         
         next_btn.click(
-            fn=lambda: navigate_phase("next"),
+            fn=next_phase,
             outputs=[status_display, conversation_display, progress_bar, current_phase_display]
         )
+        
+        show_earlier_btn.click(
+            fn=show_earlier_messages,
+            outputs=[conversation_display]
+        )
     
     return demo
 
@@ -0,0 +1,71 @@
+# dedup.py
+"""
+Near-duplicate chunk elimination with MinHash signatures and LSH banding.
+
+Each chunk is reduced to a set of word shingles, the set to a MinHash
+signature, and signatures are bucketed band by band. Chunks that share a
+bucket are candidates; a candidate whose estimated Jaccard similarity with
+an already kept chunk reaches the threshold is dropped before embedding.
+"""
+import re
+import zlib
+
+import numpy as np
+
+_PRIME = 4294967291  # largest prime below 2**32, so a*x + b fits in uint64
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 5) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """Fixed random permutations (a*x + b mod p) so signatures are reproducible across runs."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, tokens: set) -> np.ndarray:
+        base = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens))
+        base %= np.uint64(_PRIME)
+        hashed = (base[:, None] * self.a[None, :] + self.b[None, :]) % np.uint64(_PRIME)
+        return hashed.min(axis=0)
+
+
+def find_duplicates(texts: list, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                    shingle_size: int = 5) -> dict:
+    """
+    Return {dropped_index: kept_index} for every text that is a near duplicate
+    of an earlier one. The first occurrence is always the one kept.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm)
+    signatures = [hasher.signature(shingles(t, shingle_size)) for t in texts]
+
+    buckets = [{} for _ in range(bands)]
+    duplicates = {}
+    for i, sig in enumerate(signatures):
+        keys = [sig[b * rows:(b + 1) * rows].tobytes() for b in range(bands)]
+        candidates = set()
+        for b, key in enumerate(keys):
+            candidates.update(buckets[b].get(key, ()))
+        match = None
+        for j in sorted(candidates):
+            if np.mean(signatures[j] == sig) >= threshold:
+                match = j
+                break
+        if match is not None:
+            duplicates[i] = match
+            continue
+        for b, key in enumerate(keys):
+            buckets[b].setdefault(key, []).append(i)
+    return duplicates
@@ -0,0 +1,163 @@
+# extraction.py
+"""
+Fetch and text-extraction stages of the corpus pipeline.
+
+    fetch_pages(items)      (key, url)  -> (key, html, error, timings)   thread pool, network bound
+    extract_pages(pages)    (key, html, error, timings) -> (key, text, error, timings)   process pool, CPU bound
+
+Both are generators with a bounded number of pages in flight, so a refresh
+holds at most a few pages in memory and the caller can chunk each document
+as soon as its text is ready. Results arrive in completion order.
+`timings` carries each stage's wall time in seconds ({"fetch": .., "parse": ..})
+so the caller can record them; the extract stage runs in other processes,
+where the metrics registry would not see them.
+
+The parser backend is the first one installed of selectolax, lxml and
+BeautifulSoup's html.parser (the original, slowest one). All three take the
+same main-content element (<article>, else <main>, else <div class="content">)
+and join its non-blank text nodes with single spaces, leaving out
+script/style/template content and comments.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+BACKENDS = ["selectolax", "lxml", "html.parser"]
+_SKIP_TAGS = ["script", "style", "template"]
+
+
+def _join(strings) -> str:
+    return " ".join(s for s in (s.strip() for s in strings) if s)
+
+
+def _extract_selectolax(html: str) -> str:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    node = tree.css_first("article") or tree.css_first("main") or tree.css_first("div.content")
+    if node is None:
+        return None
+    node.strip_tags(_SKIP_TAGS)
+    return _join(n.text_content or "" for n in node.traverse(include_text=True) if n.tag == "-text")
+
+
+def _extract_lxml(html: str) -> str:
+    import lxml.html
+    from lxml import etree
+
+    root = lxml.html.fromstring(html)
+    found = (root.xpath("//article") or root.xpath("//main")
+             or root.xpath("//div[contains(concat(' ', normalize-space(@class), ' '), ' content ')]"))
+    if not found:
+        return None
+    node = found[0]
+    etree.strip_elements(node, *_SKIP_TAGS, etree.Comment, with_tail=False)
+    return _join(node.itertext())
+
+
+def _extract_bs4(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    node = soup.find("article") or soup.find("main") or soup.find("div", class_="content")
+    if node is None:
+        return None
+    return _join(node.stripped_strings)
+
+
+_EXTRACTORS = {"selectolax": _extract_selectolax, "lxml": _extract_lxml, "html.parser": _extract_bs4}
+_MODULES = {"selectolax": "selectolax.lexbor", "lxml": "lxml.html", "html.parser": "bs4"}
+
+
+def pick_backend(preferred: str = "auto") -> str:
+    """The first installed backend, starting from `preferred` ("auto" = fastest available)."""
+    import importlib.util
+
+    order = BACKENDS if preferred == "auto" else [preferred] + [b for b in BACKENDS if b != preferred]
+    for backend in order:
+        if importlib.util.find_spec(_MODULES[backend].split(".")[0]) is not None:
+            return backend
+    raise ImportError("No HTML parser installed: pip install selectolax (or lxml, or beautifulsoup4)")
+
+
+def extract_main_text(html: str, backend: str = "auto") -> str:
+    """Return the page's main-content text, or raise ValueError when there is none."""
+    text = _EXTRACTORS[pick_backend(backend)](html)
+    if not text:
+        raise ValueError("Could not find main content on the page")
+    return text
+
+
+def _extract_job(key, html: str, backend: str):
+    # Runs in a worker process; errors come back as values so one bad page does not stop the stream
+    start = time.perf_counter()
+    try:
+        text, error = extract_main_text(html, backend), None
+    except Exception as e:
+        text, error = None, f"{type(e).__name__}: {e}"
+    return key, text, error, time.perf_counter() - start
+
+
+def _drain(pending: set, limit: int):
+    """Wait until fewer than `limit` futures are pending; return (finished results, still pending)."""
+    results = []
+    while len(pending) >= max(limit, 1):
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        results.extend(future.result() for future in done)
+    return results, pending
+
+
+def _fetch(key, url: str, timeout: float):
+    import requests
+
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()  # Raise an exception for bad status codes
+        html, error = response.text, None
+    except requests.RequestException as e:
+        html, error = None, f"Failed to retrieve content: {e}"
+    return key, html, error, {"fetch": time.perf_counter() - start}
+
+
+def fetch_pages(items, workers: int = 4, max_in_flight: int = 8, timeout: float = 30.0):
+    """Yield (key, html, error, timings) for each (key, url), fetching on a thread pool."""
+    with ThreadPoolExecutor(workers, thread_name_prefix="fetch") as pool:
+        pending = set()
+        for key, url in items:
+            pending.add(pool.submit(_fetch, key, url, timeout))
+            done, pending = _drain(pending, max_in_flight)
+            yield from done
+        done, _ = _drain(pending, 1)
+        yield from done
+
+
+def extract_pages(pages, workers: int = None, max_in_flight: int = None, backend: str = "auto"):
+    """
+    Yield (key, text, error, timings) for each (key, html, error, timings) page,
+    parsing on a process pool and adding the "parse" time to `timings`. Pages
+    that already failed upstream are passed through.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    backend = pick_backend(backend)
+    with ProcessPoolExecutor(workers) as pool:
+        # Start the workers before the first page is pulled, i.e. before the
+        # fetch threads exist, so forking never copies a busy thread
+        pool.submit(int).result()
+        pending, upstream = set(), {}
+        for key, html, error, timings in pages:
+            if error is not None:
+                yield key, None, error, timings
+                continue
+            upstream[key] = timings
+            pending.add(pool.submit(_extract_job, key, html, backend))
+            done, pending = _drain(pending, max_in_flight)
+            yield from _with_parse_time(done, upstream)
+        done, _ = _drain(pending, 1)
+        yield from _with_parse_time(done, upstream)
+
+
+def _with_parse_time(results, upstream: dict):
+    for key, text, error, seconds in results:
+        yield key, text, error, {**upstream.pop(key), "parse": seconds}
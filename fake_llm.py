@@ -0,0 +1,59 @@
+# fake_llm.py
+import asyncio
+import hashlib
+
+# Canned interviewer phrases; the prompt hash picks which ones are used so
+# the same prompt always produces the same feedback.
+_PHRASES = [
+    "good start on the functional requirements.",
+    "clarify the read to write ratio.",
+    "consider a cache in front of the database.",
+    "the api should be versioned.",
+    "think about how the service scales horizontally.",
+    "what happens when a node fails?",
+    "add rate limiting to the public endpoints.",
+    "partition the data by user id.",
+    "explain the consistency model you chose.",
+    "a message queue would decouple these services.",
+]
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for a real model so benchmarks and batch runs
+    work offline. Output depends only on the prompt text and max_tokens,
+    and an optional fixed delay simulates model latency.
+    """
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+
+    def complete(self, prompt: str, max_tokens: int = 300) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        words = []
+        i = 0
+        while len(words) < max_tokens // 2:
+            words.extend(_PHRASES[digest[i % len(digest)] % len(_PHRASES)].split())
+            i += 1
+        return "summary: " + " ".join(words[: max_tokens // 2])
+
+    async def generate(self, prompt: str, max_tokens: int = 300) -> str:
+        self.calls += 1
+        text = self.complete(prompt, max_tokens)
+        delay = self.latency
+        if self.tokens_per_second:
+            delay += len(text.split()) / self.tokens_per_second
+        if delay:
+            await asyncio.sleep(delay)
+        return text
+
+    async def sampling_handler(self, messages, params, context) -> str:
+        """Answer a server-side ctx.sample request (fastmcp Client sampling_handler)."""
+        prompt = "\n".join(
+            getattr(m.content, "text", "") for m in messages
+        )
+        if params.systemPrompt:
+            prompt = params.systemPrompt + "\n" + prompt
+        return await self.generate(prompt, params.maxTokens or 300)
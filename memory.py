@@ -1,6 +1,7 @@
 # memory.py
 from collections import defaultdict
 from typing import List, Dict
+import metrics
 
 class ConversationMemory:
     """
@@ -12,6 +13,7 @@ class ConversationMemory:
         self._store: Dict[str, List[dict]] = defaultdict(list)
         self.max_turns = max_turns
 
+    @metrics.timed("memory.add")
     def add(self, user_id: str, role: str, text: str):
         convo = self._store[user_id]
         convo.append({"role": role, "text": text})
@@ -19,5 +21,10 @@ class ConversationMemory:
         if len(convo) > self.max_turns * 2:  # user+assistant = 2 msgs per turn
             self._store[user_id] = convo[-self.max_turns * 2 :]
 
+    def has_history(self, user_id: str) -> bool:
+        """True when the user already has turns stored, without creating an entry."""
+        return bool(self._store.get(user_id))
+
+    @metrics.timed("memory.history")
     def history(self, user_id: str) -> List[dict]:
         return self._store[user_id]
@@ -0,0 +1,217 @@
+# metrics.py
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+# Upper bounds (seconds) of the latency buckets, Prometheus style
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Load parameters globally
+with open("parameters.json", "r") as f:
+    _metrics_params = json.load(f).get("metrics", {})
+
+_NULL_SPAN = nullcontext()
+
+# Per-request collector set by collect(); spans and counters that run inside
+# it are also added to it, so a single request can report its own stages.
+_current = ContextVar("metrics_current", default=None)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. Quantiles are estimated by linear
+    interpolation inside the bucket that holds the requested rank.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx] if idx < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": round(self.sum, 6),
+                "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+                "p50": round(self.quantile(0.50), 6),
+                "p95": round(self.quantile(0.95), 6),
+                "p99": round(self.quantile(0.99), 6),
+                "max": round(self.max, 6),
+            }
+
+
+class Registry:
+    """
+    Holds one latency histogram per stage plus plain counters and gauges.
+    When disabled, span() hands back a shared no-op context manager so the
+    instrumented code pays for one attribute lookup and nothing else.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        hist = self._histograms.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(stage, Histogram())
+        return hist
+
+    def observe(self, stage: str, seconds: float):
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    def span(self, stage: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(stage)
+
+    @contextmanager
+    def _span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.histogram(stage).observe(elapsed)
+            collected = _current.get()
+            if collected is not None:
+                stages = collected["stages"]
+                stages[stage] = stages.get(stage, 0.0) + elapsed
+
+    def inc(self, name: str, value: float = 1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + value
+            collected = _current.get()
+            if collected is not None:
+                counters = collected["counters"]
+                counters[name] = counters.get(name, 0) + value
+
+    @contextmanager
+    def collect(self):
+        """
+        Gather the stage timings and counters of everything run inside the
+        block (including awaited coroutines) into a dict:
+            {"stages": {stage: seconds}, "counters": {name: value}}
+        """
+        collected = {"stages": {}, "counters": {}}
+        token = _current.set(collected)
+        try:
+            yield collected
+        finally:
+            _current.reset(token)
+
+    def set_gauge(self, name: str, value: float):
+        if self.enabled:
+            self._gauges[name] = value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "stages": {name: h.snapshot() for name, h in sorted(self._histograms.items())},
+            "counters": dict(sorted(self._counters.items())),
+            "gauges": dict(sorted(self._gauges.items())),
+        }
+
+    def to_prometheus(self, prefix: str = "sdf") -> str:
+        """Render everything in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Latency of each pipeline stage.",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        for stage, hist in sorted(self._histograms.items()):
+            with hist._lock:
+                counts, total, count = list(hist.counts), hist.sum, hist.count
+            cumulative = 0
+            for bound, n in zip(hist.buckets, counts):
+                cumulative += n
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+        for name, value in sorted(self._counters.items()):
+            metric = f"{prefix}_{_sanitize(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, value in sorted(self._gauges.items()):
+            metric = f"{prefix}_{_sanitize(name)}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _sanitize(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+registry = Registry(enabled=_metrics_params.get("enabled", True))
+
+# Module-level shortcuts so call sites read `with metrics.span("rag.search"):`
+span = registry.span
+inc = registry.inc
+collect = registry.collect
+set_gauge = registry.set_gauge
+snapshot = registry.snapshot
+to_prometheus = registry.to_prometheus
+
+
+def timed(stage: str):
+    """Decorator that wraps a sync or async function in a span."""
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with registry.span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with registry.span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
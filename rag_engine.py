@@ -1,18 +1,25 @@
 # rag_engine.py
-from langchain_community.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.docstore.document import Document
+# Heavy dependencies (langchain, Chroma, sentence-transformers/torch, bs4,
+# requests) are imported inside the functions that need them, so importing
+# this module - and starting server.py - stays fast. They load on the first
+# retrieval, and the scraping ones only when a refresh actually fetches pages.
 from pathlib import Path
 import json
 import os
-import requests
-from bs4 import BeautifulSoup
+import sys
+import threading
+import time
+import metrics
 
 # Declare global variables
 global params
 params = None
 _vector_store = None
+_embedder = None
+last_build_report = {}
+active_index_version = None
+_index_watcher = None
+_swap_lock = threading.Lock()
 
 # Load parameters globally
 with open("parameters.json", "r") as f:
@@ -22,66 +29,330 @@ with open("parameters.json", "r") as f:
         params = json.load(f)
 
 EMBED_MODEL = params["embed_model"]
+INDEX_PARAMS = global_params.get("index", {})
+EXTRACTION_PARAMS = params.get("extraction", {})
+ANN_PARAMS = params.get("ann", {})
+
+# Set by serve.py for its workers: a prebuilt memory-mapped index shared by
+# all worker processes, and the router endpoint that embeds queries.
+SHARED_INDEX_ENV = "SDF_SHARED_INDEX"
+EMBED_URL_ENV = "SDF_EMBED_URL"
+WORKER_ID_ENV = "SDF_WORKER_ID"
+
+def iter_stored_texts(skip: set = frozenset()):
+    """Yield (topic, text) for each document already in documents/, one file at a time."""
+    for file in sorted(os.listdir("documents")):
+        if file.endswith(".txt") and file[:-len(".txt")] not in skip:
+            yield file[:-len(".txt")], Path(f"documents/{file}").read_text(encoding="utf-8")
 
 # need to retrieve from the hellointerview wesbite andstore the text in the documents folder
-def retrieve_text_single_topic(url: str):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract the main content - adjust selectors based on the website structure
-        main_content = soup.find('article') or soup.find('main') or soup.find('div', class_='content')
-        
-        if main_content:
-            # Get all text content, removing extra whitespace
-            text = ' '.join(main_content.stripped_strings)
-            return text
-        else:
-            raise ValueError("Could not find main content on the page")
-            
-    except requests.RequestException as e:
-        raise Exception(f"Failed to retrieve content: {str(e)}")
-    
-# only retrive it once
-def retrieve_text_all_topics():
-    if not os.path.exists("documents"):
-        os.makedirs("documents")
-    for topic in params["topics"]:
-        url = params["base_url"] + topic
-        text = retrieve_text_single_topic(url)
+def stream_topic_texts(refresh: bool = False):
+    """
+    Yield (topic, text) for the whole corpus: documents already on disk first,
+    then the topics that have to be fetched (all of them when refresh is set),
+    each one as soon as the parallel fetch/extract stages finish it. Fetched
+    texts are also stored in documents/.
+    """
+    os.makedirs("documents", exist_ok=True)
+    missing = [t for t in params["topics"] if refresh or not os.path.exists(f"documents/{t}.txt")]
+    yield from iter_stored_texts(skip=set(missing))
+    if not missing:
+        return
+
+    from extraction import extract_pages, fetch_pages
+
+    max_in_flight = EXTRACTION_PARAMS.get("max_in_flight", 8)
+    pages = fetch_pages(
+        ((topic, params["base_url"] + topic) for topic in missing),
+        workers=EXTRACTION_PARAMS.get("fetch_workers", 4),
+        max_in_flight=max_in_flight,
+    )
+    extracted = extract_pages(
+        pages,
+        workers=EXTRACTION_PARAMS.get("extract_workers") or None,
+        max_in_flight=max_in_flight,
+        backend=EXTRACTION_PARAMS.get("parser", "auto"),
+    )
+    for topic, text, error, timings in extracted:
+        # Fetch and parse ran in pool threads/processes; record their times here
+        for stage, seconds in timings.items():
+            metrics.registry.observe(f"rag.{stage}", seconds)
+        if error is not None:
+            metrics.inc("rag.extract.errors")
+            raise Exception(f"Failed to extract {topic}: {error}")
+        metrics.inc("rag.extract.pages")
         store_text(text, f"documents/{topic}.txt")
+        yield topic, text
 
 def store_text(text: str, text_path: str = "documents/hello_interview.txt"):
     with open(text_path, "w") as f:
         f.write(text)
 
-def _build_store():
-    """Build vector store from all documents in the documents directory."""
-    all_texts = []
-    for file in os.listdir("documents"):
-        if file.endswith(".txt"):
-            text = Path(f"documents/{file}").read_text(encoding="utf-8")
-            all_texts.append(text)
-    
+def load_topic_text(topic: str) -> str:
+    """Return the stored breakdown text of a single topic."""
+    return Path(f"documents/{topic}.txt").read_text(encoding="utf-8")
+
+def resolve_topic(topic: str):
+    """Map free text such as 'Design a URL shortener like Bitly' onto a corpus topic slug."""
+    text = topic.lower()
+    for slug in params["topics"]:
+        if slug in text or slug.replace("-", " ") in text:
+            return slug
+    return None
+
+def get_embedder():
+    """Return the shared embedding model, loading it on first use."""
+    global _embedder
+    if _embedder is None:
+        with metrics.span("rag.load_model"):
+            if os.environ.get(EMBED_URL_ENV):
+                from shared_index import RemoteEmbedder
+                _embedder = RemoteEmbedder(os.environ[EMBED_URL_ENV])
+            else:
+                from langchain.embeddings import HuggingFaceEmbeddings
+                _embedder = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    return _embedder
+
+def build_documents(topic_texts=None):
+    """
+    Split (topic, text) pairs into chunks with topic metadata, then drop near
+    duplicates. Each text is chunked as it arrives, so a streamed corpus is
+    never held in memory as whole pages. Defaults to the stored documents.
+    """
+    from langchain.text_splitter import CharacterTextSplitter
+
     splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    docs = splitter.create_documents(all_texts)
-    embedder = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-    return Chroma.from_documents(docs, embedder)
+    docs = []
+    for topic, text in topic_texts if topic_texts is not None else iter_stored_texts():
+        with metrics.span("rag.split"):
+            docs.extend(splitter.create_documents([text], metadatas=[{"topic": topic}]))
+    with metrics.span("rag.dedup"):
+        return _dedup_documents(docs)
+
+def _build_store(refresh: bool = False):
+    """Build vector store from the corpus, fetching topics that are missing (or all with refresh)."""
+    from langchain_community.vectorstores import Chroma
+
+    docs, report = build_documents(stream_topic_texts(refresh))
+    embedder = get_embedder()
+    with metrics.span("rag.embed"):
+        start = time.perf_counter()
+        store = Chroma.from_documents(docs, embedder)
+        embed_seconds = time.perf_counter() - start
+    _report_build(report, embed_seconds)
+    return store
+
+def export_shared_index(path: str, refresh: bool = False) -> dict:
+    """Fetch, chunk and embed the corpus into a memory-mapped index file (see shared_index.py)."""
+    from shared_index import write_index
+
+    docs, report = build_documents(stream_topic_texts(refresh))
+    embedder = get_embedder()
+    with metrics.span("rag.embed"):
+        start = time.perf_counter()
+        vectors = embedder.embed_documents([d.page_content for d in docs])
+        embed_seconds = time.perf_counter() - start
+    write_index(path, [d.page_content for d in docs], vectors, [dict(d.metadata) for d in docs])
+    if ANN_PARAMS.get("enabled", False) and len(docs) >= ANN_PARAMS.get("min_chunks", 20000):
+        _build_ann(path, report)
+    _report_build(report, embed_seconds)
+    return report
+
+def _build_ann(path: str, report: dict):
+    """Build the HNSW sidecar for an index file from the (already normalized) vectors in it."""
+    from ann_index import build_hnsw, sidecar_path
+    from shared_index import MmapIndex
+
+    index = MmapIndex(path, use_ann=False)
+    with metrics.span("rag.ann_build"):
+        start = time.perf_counter()
+        graph = build_hnsw(
+            index.vectors,
+            M=ANN_PARAMS.get("M", 16),
+            ef_construction=ANN_PARAMS.get("ef_construction", 200),
+        )
+        graph.save(sidecar_path(path))
+    index.close()
+    report["ann"] = {
+        "type": "hnsw",
+        "M": graph.M,
+        "ef_construction": graph.ef_construction,
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+
+def open_index(path: str):
+    """
+    Open an index file with the configured ANN settings. serve.py workers skip
+    the HNSW graph unless `ann.multi_worker` is set: loading it copies the graph
+    and every vector into the worker's heap, once per worker.
+    """
+    from shared_index import MmapIndex
+
+    use_ann = ANN_PARAMS.get("enabled", False)
+    if use_ann and os.environ.get(WORKER_ID_ENV) is not None and not ANN_PARAMS.get("multi_worker", False):
+        use_ann = False
+    return MmapIndex(path, use_ann=use_ann, ef_search=ANN_PARAMS.get("ef_search", 64))
 
-def initialize_rag():
+def _dedup_documents(docs: list):
+    """Drop near-duplicate chunks (boilerplate repeated across breakdowns) before embedding."""
+    from dedup import find_duplicates
+
+    dedup_params = params.get("dedup", {})
+    report = {"chunks_before": len(docs), "chunks_after": len(docs), "dropped": 0}
+    if not dedup_params.get("enabled", True) or not docs:
+        return docs, report
+    duplicates = find_duplicates(
+        [d.page_content for d in docs],
+        threshold=dedup_params.get("threshold", 0.8),
+        num_perm=dedup_params.get("num_perm", 64),
+        bands=dedup_params.get("bands", 16),
+        shingle_size=dedup_params.get("shingle_size", 5),
+    )
+    # Merge: the kept chunk remembers how many copies it stands for
+    for kept in duplicates.values():
+        docs[kept].metadata["duplicates"] = docs[kept].metadata.get("duplicates", 0) + 1
+    kept_docs = [d for i, d in enumerate(docs) if i not in duplicates]
+    report.update({
+        "chunks_after": len(kept_docs),
+        "dropped": len(duplicates),
+        "chars_before": sum(len(d.page_content) for d in docs),
+        "chars_after": sum(len(d.page_content) for d in kept_docs),
+    })
+    return kept_docs, report
+
+def _report_build(report: dict, embed_seconds: float):
+    """Record how much the index shrank and roughly how much embedding time that saved."""
+    global last_build_report
+    kept = report["chunks_after"]
+    per_chunk = embed_seconds / kept if kept else 0.0
+    report["embed_seconds"] = round(embed_seconds, 3)
+    report["embed_seconds_saved"] = round(report["dropped"] * per_chunk, 3)
+    report["shrink_ratio"] = round(report["dropped"] / report["chunks_before"], 4) if report["chunks_before"] else 0.0
+    last_build_report = report
+    metrics.set_gauge("rag.index.chunks", kept)
+    metrics.set_gauge("rag.dedup.dropped", report["dropped"])
+    metrics.set_gauge("rag.dedup.embed_seconds_saved", report["embed_seconds_saved"])
+    # stdout belongs to the MCP stdio transport
+    print(f"[rag] index built: {report['chunks_before']} -> {kept} chunks "
+          f"({report['shrink_ratio']:.1%} near-duplicates dropped, "
+          f"~{report['embed_seconds_saved']}s of embedding saved)", file=sys.stderr)
+
+def initialize_rag(refresh: bool = False):
     """Initialize the RAG system by retrieving texts and building the vector store."""
     global _vector_store
-    retrieve_text_all_topics()
-    _vector_store = _build_store()
+    with metrics.span("rag.initialize"):
+        if os.environ.get(SHARED_INDEX_ENV) and not refresh:
+            _vector_store = open_index(os.environ[SHARED_INDEX_ENV])
+            return
+        # Prefer a prebuilt artifact from build_index.py: no scraping or embedding at startup
+        import build_index
+        if not refresh and build_index.current_version():
+            swap_index()
+        else:
+            _vector_store = _build_store(refresh)
+        # Also when serving an in-process build, so a later `build_index.py build --activate` is picked up
+        if INDEX_PARAMS.get("watch", True):
+            start_index_watcher(INDEX_PARAMS.get("watch_interval", 5.0))
+
+def swap_index(version: str = None) -> dict:
+    """
+    Switch retrieval to an index artifact (default: the one named by CURRENT).
+    The new index is fully loaded before a single reference assignment makes it
+    live, so queries already running keep using the old one until they finish.
+    """
+    global _vector_store, active_index_version
+    import build_index
+
+    version = version or build_index.current_version()
+    if version is None:
+        raise ValueError("No index artifact to load; run `python build_index.py build` first")
+    # Only names of built artifacts, never paths: the version also ends up in CURRENT
+    if version not in build_index.list_versions():
+        raise FileNotFoundError(f"No index artifact named {version!r}")
+    manifest = build_index.read_manifest(version)
+    if manifest["embed_model"] != EMBED_MODEL:
+        raise ValueError(f"Index {version} was embedded with {manifest['embed_model']}, not {EMBED_MODEL}")
+    with metrics.span("rag.swap_index"):
+        index = open_index(str(build_index.artifact_dir(version) / build_index.INDEX_FILE))
+    _vector_store = index
+    active_index_version = version
+    metrics.inc("rag.index.swaps")
+    metrics.set_gauge("rag.index.chunks", index.size)
+    return manifest
+
+def activate_index(version: str = None) -> dict:
+    """
+    Make `version` (default: the one named by CURRENT) the active artifact for
+    every process: load it here, then point indexes/CURRENT at it so the
+    watchers of all other workers follow. Writing CURRENT is what keeps the
+    local watcher from swapping straight back.
+    """
+    import build_index
+
+    with _swap_lock:
+        manifest = swap_index(version)
+        build_index.set_current(manifest["version"])
+    return manifest
 
-def get_snippets(query: str, k: int = 4) -> str:
-    """Return top-k snippets concatenated for prompt injection."""
+def _watch_current(interval: float):
+    import build_index
+
+    while True:
+        time.sleep(interval)
+        try:
+            with _swap_lock:
+                version = build_index.current_version()
+                if not version or version == active_index_version:
+                    continue
+                swap_index(version)
+            print(f"[rag] swapped to index {version}", file=sys.stderr)
+        except Exception as e:
+            print(f"[rag] index swap failed: {e}", file=sys.stderr)
+
+def start_index_watcher(interval: float = 5.0):
+    """Poll indexes/CURRENT in a daemon thread and hot-swap when it changes."""
+    global _index_watcher
+    if _index_watcher is None:
+        _index_watcher = threading.Thread(target=_watch_current, args=(interval,), name="index-watcher", daemon=True)
+        _index_watcher.start()
+
+def get_snippets(query: str, k: int = 4, topic: str = None) -> str:
+    """Return top-k snippets concatenated for prompt injection, optionally from one topic only."""
     if _vector_store is None:
         initialize_rag()
-    matches = _vector_store.similarity_search(query, k=k)
+    # Hold our own reference so a concurrent swap cannot change the index mid-query
+    store = _vector_store
+    with metrics.span("rag.search"):
+        if topic is None:
+            matches = store.similarity_search(query, k=k)
+        else:
+            matches = _search_by_vector(store, get_embedder().embed_query(query), k, topic)
     return "\n\n".join(d.page_content for d in matches)
 
-# Initialize RAG system when module is imported
-initialize_rag()
+def _search_by_vector(store, vector, k: int, topic: str = None) -> list:
+    """Vector search on either store type, optionally limited to one topic."""
+    from shared_index import MmapIndex
+
+    if isinstance(store, MmapIndex):
+        return store.similarity_search_by_vector(vector, k=k, topic=topic)
+    if topic is None:
+        return store.similarity_search_by_vector(vector, k=k)
+    return store.similarity_search_by_vector(vector, k=k, filter={"topic": topic})
+
+def get_snippets_batch(queries: list, k: int = 4, topics: list = None) -> list:
+    """
+    get_snippets for many queries with one embedding call. `topics` optionally
+    limits each query to one corpus topic (None entries search everything).
+    """
+    if _vector_store is None:
+        initialize_rag()
+    store = _vector_store
+    with metrics.span("rag.embed_queries"):
+        vectors = get_embedder().embed_documents(list(queries))
+    topics = topics or [None] * len(vectors)
+    results = []
+    with metrics.span("rag.search"):
+        for vector, topic in zip(vectors, topics):
+            matches = _search_by_vector(store, vector, k, topic)
+            results.append("\n\n".join(d.page_content for d in matches))
+    return results
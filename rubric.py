@@ -0,0 +1,262 @@
+# rubric.py
+"""
+Local rubric scorer: grades a candidate's answer for one interview phase
+against the reference breakdown of the same topic, without calling an LLM.
+
+The score mixes three signals:
+  - section coverage: how many of the phase's rubric items the answer mentions
+  - key-term recall: how many distinctive terms of the reference section appear
+  - similarity: cosine similarity between the answer and the reference chunks
+"""
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import metrics
+from rag_engine import get_embedder, load_topic_text, params, resolve_topic
+
+# Rubric per phase. "headings" slice the phase's section out of the flattened
+# breakdown text (first match wins), "items" are what a complete answer covers,
+# each satisfied by any of its keywords. Keywords match whole words (plural
+# "s"/"es" allowed) and not after "non"; a trailing "*" matches a prefix, a
+# leading "*" drops the left word boundary, and "re:" marks a raw regex.
+PHASES = {
+    "requirements": {
+        "headings": ["Functional Requirements", "Requirements"],
+        "items": {
+            "functional requirements": ["functional", "users should be able", "user can", "users can"],
+            "non-functional requirements": ["non-functional", "nonfunctional", "system should"],
+            "scale estimate": ["scale", "qps", "requests per second", "dau", "million", "billion"],
+            "latency target": ["latency", "ms", "millisecond", "fast", "real-time", "realtime"],
+            "availability / consistency": ["availability", "available", "consistency", "consistent", "cap"],
+            "out of scope": ["out of scope", "below the line", "not in scope"],
+        },
+    },
+    "core-entities": {
+        "headings": ["Core Entities"],
+        "items": {
+            "primary entities": ["entity", "entities", "table", "model", "object"],
+            "user entity": ["user"],
+            "relationships": ["relationship", "foreign key", "belongs to", "has many", "references", "id", "*_id"],
+            "key attributes": ["attribute", "field", "column", "timestamp", "status"],
+        },
+    },
+    "api-design": {
+        "headings": ["API or System Interface", "API", "System Interface"],
+        "items": {
+            "endpoints": ["get", "post", "put", "patch", "delete", "endpoint", r"re:(?<![\w/])/[a-z{:]"],
+            "request / response shape": ["request", "response", "body", "returns", "payload", "*->*"],
+            "authentication": ["auth*", "token", "jwt", "session", "header"],
+            "pagination / limits": ["pagination", "page", "cursor", "limit", "rate limit"],
+        },
+    },
+    "architecture": {
+        "headings": ["High-Level Design", "High Level Design"],
+        "items": {
+            "client / gateway": ["client", "api gateway", "gateway", "load balancer"],
+            "services": ["service", "server", "worker"],
+            "database": ["database", "db", "postgres*", "mysql", "dynamo*", "cassandra", "storage"],
+            "cache": ["cache", "caching", "redis", "memcached", "cdn"],
+            "data flow": ["flow", "request", "sends", "writes", "reads", "then"],
+        },
+    },
+    "deep-dive": {
+        "headings": ["Potential Deep Dives", "Deep Dives", "Deep Dive"],
+        "items": {
+            "scaling": ["scale", "scaling", "horizontal*", "shard*", "partition*", "replica*"],
+            "caching strategy": ["cache", "caching", "ttl", "invalidation", "eviction"],
+            "failure handling": ["failure", "fault", "retry", "retries", "fallback", "redundan*", "replicat*"],
+            "consistency / concurrency": ["consistency", "lock*", "transaction", "race", "idempot*"],
+            "bottlenecks": ["bottleneck", "hot", "hotspot", "throughput", "latency", "queue"],
+        },
+    },
+}
+
+
+
+def _keyword_pattern(keyword: str) -> str:
+    if keyword.startswith("re:"):
+        return keyword[3:]
+    left = "" if keyword.startswith("*") else r"(?<![a-z-])(?<!non )"
+    right = "" if keyword.endswith("*") else r"(?:e?s)?(?![a-z0-9])"
+    return left + re.escape(keyword.strip("*")) + right
+
+
+# One compiled alternation per rubric item
+_ITEM_PATTERNS = {
+    phase: {name: re.compile("|".join(map(_keyword_pattern, keywords))) for name, keywords in spec["items"].items()}
+    for phase, spec in PHASES.items()
+}
+
+# Client phase names and MCP prompt names that map onto the rubric keys
+PHASE_ALIASES = {
+    "requirements": "requirements",
+    "requirements-evaluation": "requirements",
+    "core entities": "core-entities",
+    "core-entities-evaluation": "core-entities",
+    "api design": "api-design",
+    "api-design-evaluation": "api-design",
+    "architecture": "architecture",
+    "architecture-evaluation": "architecture",
+    "high-level design": "architecture",
+    "deep dive": "deep-dive",
+    "deep-dive-evaluation": "deep-dive",
+}
+
+_SECTION_ORDER = ["requirements", "core-entities", "api-design", "architecture", "deep-dive"]
+_WORD = re.compile(r"[a-z][a-z0-9\-]{2,}")
+_STOPWORDS = set("""
+the and for are but not you your with this that from they have has was were will would can could
+should its into our out more most than then them there these those what when where which while who
+why how all any each both some such only own same too very just also like use used using one two
+get set let may might must need needs over under about after before between because does did done
+well way ways lot lots make makes made want wants let's it's we'll don't here their other many much
+""".split())
+_reference_cache = {}
+
+_rubric_params = params.get("rubric", {})
+ADVANCE_THRESHOLD = _rubric_params.get("advance_threshold", 0.65)
+HINT_THRESHOLD = _rubric_params.get("hint_threshold", 0.35)
+WEIGHTS = _rubric_params.get("weights", {"coverage": 0.4, "term_recall": 0.3, "similarity": 0.3})
+KEY_TERMS = _rubric_params.get("key_terms", 15)
+
+
+def normalize_phase(phase: str) -> str:
+    key = phase.strip().lower()
+    if key in PHASES:
+        return key
+    if key in PHASE_ALIASES:
+        return PHASE_ALIASES[key]
+    raise ValueError(f"Unknown phase: {phase}")
+
+
+def _stem(word: str) -> str:
+    """Drop one plural "s" ("servers" -> "server"), but keep "access", "status", "analysis"."""
+    if len(word) > 4 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> list:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _terms(text: str) -> list:
+    return [_stem(w) for w in _words(text)]
+
+
+def _slice_section(text: str, phase: str) -> str:
+    """Cut the phase's section out of a breakdown, up to the next phase's heading."""
+    lower = text.lower()
+    start = -1
+    for heading in PHASES[phase]["headings"]:
+        start = lower.find(heading.lower())
+        if start != -1:
+            break
+    if start == -1:
+        return text
+    end = len(text)
+    for later in _SECTION_ORDER[_SECTION_ORDER.index(phase) + 1:]:
+        for heading in PHASES[later]["headings"]:
+            pos = lower.find(heading.lower(), start + 1)
+            if pos != -1:
+                end = min(end, pos)
+    return text[start:end]
+
+
+def _chunks(text: str, size: int = 500) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [text]
+
+
+def _reference(topic: str, phase: str) -> dict:
+    """Reference chunks, their normalized embeddings and key terms, cached per (topic, phase)."""
+    key = (topic, phase)
+    if key in _reference_cache:
+        metrics.inc("rubric.cache_hit")
+        return _reference_cache[key]
+    metrics.inc("rubric.cache_miss")
+
+    topics = [topic] if topic else params["topics"]
+    sections = [_slice_section(load_topic_text(t), phase) for t in topics]
+    section_text = "\n".join(sections)
+
+    # Distinctive terms: frequent in this section, rare across the other topics
+    doc_freq = Counter()
+    for t in params["topics"]:
+        doc_freq.update(set(_terms(load_topic_text(t))))
+    n_docs = len(params["topics"])
+    # Stems are matched; missing terms are reported in the form the reference uses most
+    forms = defaultdict(Counter)
+    for word in _words(section_text):
+        forms[_stem(word)][word] += 1
+    tf = Counter({stem: sum(c.values()) for stem, c in forms.items()})
+    headings = set(_terms(" ".join(h for p in PHASES.values() for h in p["headings"])))
+    scored = {w: c * math.log((1 + n_docs) / (1 + doc_freq[w]))
+              for w, c in tf.items() if c > 1 and w not in headings}
+    key_terms = [w for w, _ in sorted(scored.items(), key=lambda kv: -kv[1])[:KEY_TERMS]]
+
+    chunks = _chunks(section_text)
+    vectors = np.asarray(get_embedder().embed_documents(chunks), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+
+    ref = {"vectors": vectors, "key_terms": key_terms,
+           "surface": {t: forms[t].most_common(1)[0][0] for t in key_terms}}
+    _reference_cache[key] = ref
+    return ref
+
+
+def score_answer(topic: str, phase: str, answer: str) -> dict:
+    """
+    Score an answer for a phase. Returns the overall score in [0, 1], a verdict
+    ("advance", "improve" or "hint"), the three component scores and the rubric
+    items and key terms the answer is missing.
+    """
+    start = time.perf_counter()
+    with metrics.span("rubric.score"):
+        phase_key = normalize_phase(phase)
+        slug = resolve_topic(topic)
+        ref = _reference(slug, phase_key)
+        answer_lower = answer.lower()
+
+        items = _ITEM_PATTERNS[phase_key]
+        missing_items = [name for name, pattern in items.items() if not pattern.search(answer_lower)]
+        coverage = 1 - len(missing_items) / len(items)
+
+        answer_terms = set(_terms(answer))
+        missing_terms = [ref["surface"][t] for t in ref["key_terms"] if t not in answer_terms]
+        term_recall = 1 - len(missing_terms) / len(ref["key_terms"]) if ref["key_terms"] else 1.0
+
+        with metrics.span("rubric.embed"):
+            vec = np.asarray(get_embedder().embed_query(answer), dtype=np.float32)
+        vec /= np.linalg.norm(vec) + 1e-12
+        sims = np.sort(ref["vectors"] @ vec)[::-1]
+        raw_similarity = float(sims[:2].mean())
+        # MiniLM cosines of related text sit roughly in 0.2-0.7; stretch that onto 0-1
+        similarity = min(1.0, max(0.0, (raw_similarity - 0.2) / 0.5))
+
+        score = (WEIGHTS["coverage"] * coverage
+                 + WEIGHTS["term_recall"] * term_recall
+                 + WEIGHTS["similarity"] * similarity) / sum(WEIGHTS.values())
+
+    if score >= ADVANCE_THRESHOLD:
+        verdict = "advance"
+    elif score >= HINT_THRESHOLD:
+        verdict = "improve"
+    else:
+        verdict = "hint"
+
+    return {
+        "topic": slug,
+        "phase": phase_key,
+        "score": round(score, 3),
+        "verdict": verdict,
+        "coverage": round(coverage, 3),
+        "term_recall": round(term_recall, 3),
+        "similarity": round(similarity, 3),
+        "missing_items": missing_items,
+        "missing_terms": missing_terms,
+        "elapsed_ms": round(1000 * (time.perf_counter() - start), 2),
+    }
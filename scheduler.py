@@ -0,0 +1,161 @@
+# scheduler.py
+"""
+Admission control for ctx.sample calls.
+
+Every LLM sample takes a slot from a global limit and from a per-client
+limit. Requests that cannot run immediately wait in a bounded queue,
+ordered by priority (in-progress interviews first) then arrival. A request
+is shed with a fast "busy, retry after" answer when the queue is full or its
+wait exceeds the queue timeout, so a burst degrades gracefully instead of
+piling up prompts and connections.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import metrics
+
+# Load parameters globally
+with open("parameters.json", "r") as f:
+    _sampling_params = json.load(f).get("sampling", {})
+
+# Lower number = served first
+PRIORITY_IN_PROGRESS = 0
+PRIORITY_NEW = 1
+
+
+class Busy(Exception):
+    """Raised when a request is shed; carries the suggested retry delay in seconds."""
+
+    def __init__(self, retry_after: float, reason: str = "busy"):
+        super().__init__(f"{reason}, retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def to_response(self) -> dict:
+        return {"error": "busy", "reason": self.reason, "retry_after": self.retry_after}
+
+
+class SampleScheduler:
+    def __init__(self, global_limit: int = 8, per_client_limit: int = 2, queue_size: int = 32,
+                 queue_timeout: float = 10.0, retry_after: float = 5.0):
+        self.global_limit = global_limit
+        self.per_client_limit = per_client_limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._per_client = defaultdict(int)
+        self._waiters = []  # [priority, seq, user_id, future]
+        self._seq = itertools.count()
+
+    def _fits(self, user_id: str) -> bool:
+        return self._in_flight < self.global_limit and self._per_client.get(user_id, 0) < self.per_client_limit
+
+    def _acquire(self, user_id: str):
+        self._in_flight += 1
+        self._per_client[user_id] += 1
+        self._update_gauges()
+
+    def _release(self, user_id: str):
+        self._in_flight -= 1
+        self._per_client[user_id] -= 1
+        if self._per_client[user_id] <= 0:
+            del self._per_client[user_id]
+        self._wake()
+        self._update_gauges()
+
+    def _wake(self):
+        """Hand free slots to waiters in priority order, skipping clients at their own limit."""
+        for entry in sorted(self._waiters):
+            if self._in_flight >= self.global_limit:
+                break
+            user_id, fut = entry[2], entry[3]
+            if fut.done():
+                self._waiters.remove(entry)
+            elif self._per_client.get(user_id, 0) < self.per_client_limit:
+                self._waiters.remove(entry)
+                self._acquire(user_id)
+                fut.set_result(None)
+
+    @staticmethod
+    def _granted(fut) -> bool:
+        return fut.done() and not fut.cancelled() and fut.exception() is None
+
+    def _update_gauges(self):
+        metrics.set_gauge("sampling.in_flight", self._in_flight)
+        metrics.set_gauge("sampling.queue_depth", len(self._waiters))
+
+    def _shed(self, reason: str):
+        metrics.inc(f"sampling.shed.{reason}")
+        return Busy(self.retry_after, reason)
+
+    async def _wait(self, user_id: str, priority: int):
+        # Waiters whose timeout already cancelled their future are leaving; do not count or preempt them
+        self._waiters = [entry for entry in self._waiters if not entry[3].done()]
+        if len(self._waiters) >= self.queue_size:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                raise self._shed("queue_full")
+            # A new interview makes room for one that is already in progress
+            self._waiters.remove(worst)
+            worst[3].set_exception(self._shed("preempted"))
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), user_id, fut]
+        self._waiters.append(entry)
+        self._wake()
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Granted in the same loop iteration the timeout fired: give the slot back
+            if self._granted(fut):
+                self._release(user_id)
+            raise self._shed("queue_timeout")
+        except asyncio.CancelledError:
+            # Granted right before the caller went away: give the slot back
+            if self._granted(fut):
+                self._release(user_id)
+            raise
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            metrics.registry.observe("sampling.queue_wait", time.perf_counter() - start)
+            self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: int = PRIORITY_NEW):
+        """Hold one sampling slot for the duration of the block; raises Busy when shed."""
+        if not self._waiters and self._fits(user_id):
+            self._acquire(user_id)
+        else:
+            await self._wait(user_id, priority)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "clients": len(self._per_client),
+            "global_limit": self.global_limit,
+            "per_client_limit": self.per_client_limit,
+            "queue_size": self.queue_size,
+        }
+
+
+scheduler = SampleScheduler(
+    global_limit=_sampling_params.get("global_limit", 8),
+    per_client_limit=_sampling_params.get("per_client_limit", 2),
+    queue_size=_sampling_params.get("queue_size", 32),
+    queue_timeout=_sampling_params.get("queue_timeout", 10.0),
+    retry_after=_sampling_params.get("retry_after", 5.0),
+)
+SAMPLE_TIMEOUT = _sampling_params.get("sample_timeout", 60.0)
@@ -0,0 +1,238 @@
+# serve.py
+"""
+Multi-worker HTTP/SSE deployment of the MCP server.
+
+    python serve.py --workers 4 --port 8000                 # streamable HTTP on :8000/mcp/
+    python serve.py --workers 4 --port 8000 --transport sse  # SSE on :8000/sse
+
+The parent process
+  1. makes sure an index artifact exists (build_index.py): one memory-mapped
+     file with the chunk texts and embedding matrix (shared_index.py) that
+     every worker maps read-only, so the corpus lives once in the page cache;
+     workers follow indexes/CURRENT and hot-swap when it changes,
+  2. loads the embedding model once and serves query embeddings to the
+     workers on a loopback-only port, so workers never import torch,
+  3. starts N `server.py` workers and restarts any that die,
+  4. runs a session-affinity router in front of them: a request carrying a
+     known `mcp-session-id` goes back to the worker that created the session,
+     otherwise it is hashed on `X-User-Id` (or `?user_id=`, or the `user_id`
+     argument of a JSON-RPC call), and requests with none of these are spread
+     round-robin. Clients that send a stable X-User-Id therefore always reach
+     the worker that holds their ConversationMemory.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import zlib
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import build_index
+import rag_engine
+
+# Headers that describe a single hop and must not be forwarded
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "host", "content-length",
+}
+ALL_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"]
+# The SSE transport announces its message endpoint in the first event of the stream
+SSE_SESSION = re.compile(rb"session_id=([0-9a-fA-F]+)[^0-9a-fA-F]")
+
+
+class AffinityRouter:
+    def __init__(self, worker_urls: list):
+        self.worker_urls = worker_urls
+        self.sessions = {}  # mcp-session-id (or SSE session_id) -> worker index
+        self.client = httpx.AsyncClient(timeout=None)
+        self._next = itertools.count()
+
+    @staticmethod
+    def _body_user_id(body: bytes) -> str:
+        """The `user_id` argument of a JSON-RPC tools/call or prompts/get, if any."""
+        try:
+            message = json.loads(body)
+            return str(message["params"]["arguments"]["user_id"])
+        except (ValueError, TypeError, KeyError):
+            return ""
+
+    def pick(self, request: Request, body: bytes) -> int:
+        session_id = request.headers.get("mcp-session-id") or request.query_params.get("session_id")
+        if session_id in self.sessions:
+            return self.sessions[session_id]
+        key = (request.headers.get("x-user-id")
+               or request.query_params.get("user_id")
+               or self._body_user_id(body))
+        if not key:
+            # Sessions from one host (or one proxy) would all hash alike; spread them instead
+            return next(self._next) % len(self.worker_urls)
+        return zlib.crc32(key.encode("utf-8")) % len(self.worker_urls)
+
+    async def proxy(self, request: Request):
+        body = await request.body()
+        worker = self.pick(request, body)
+        url = self.worker_urls[worker] + request.url.path
+        if request.url.query:
+            url += "?" + request.url.query
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        upstream_request = self.client.build_request(request.method, url, headers=headers, content=body)
+        try:
+            upstream = await self.client.send(upstream_request, stream=True)
+        except httpx.TransportError as e:
+            return JSONResponse({"error": f"worker {worker} unavailable: {e}"}, status_code=503)
+
+        session_id = upstream.headers.get("mcp-session-id")
+        if session_id:
+            self.sessions[session_id] = worker
+        if request.method == "DELETE":
+            self.sessions.pop(request.headers.get("mcp-session-id"), None)
+
+        body_iter = upstream.aiter_raw()
+        if request.method == "GET" and upstream.headers.get("content-type", "").startswith("text/event-stream"):
+            body_iter = self._sniff_sse_session(body_iter, worker)
+        # Stream the body through untouched so SSE responses flow as they are produced
+        return StreamingResponse(
+            body_iter,
+            status_code=upstream.status_code,
+            headers={k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS},
+            background=BackgroundTask(upstream.aclose),
+        )
+
+
+    async def _sniff_sse_session(self, chunks, worker: int):
+        """Pass an SSE stream through, pinning the session_id it announces to `worker` while it lasts."""
+        head, session_id = b"", None
+        try:
+            async for chunk in chunks:
+                if head is not None:
+                    head += chunk
+                    found = SSE_SESSION.search(head)
+                    if found:
+                        session_id = found.group(1).decode()
+                        self.sessions[session_id] = worker
+                    if found or len(head) > 4096:
+                        head = None
+                yield chunk
+        finally:
+            self.sessions.pop(session_id, None)
+
+
+def make_router_app(router: AffinityRouter) -> Starlette:
+    return Starlette(routes=[Route("/{path:path}", router.proxy, methods=ALL_METHODS)])
+
+
+def make_embed_app() -> Starlette:
+    """Loopback-only service that embeds texts for the workers with the parent's model."""
+
+    async def embed(request: Request):
+        texts = (await request.json())["texts"]
+        vectors = await run_in_threadpool(rag_engine.get_embedder().embed_documents, texts)
+        return JSONResponse({"vectors": [list(map(float, v)) for v in vectors]})
+
+    return Starlette(routes=[Route("/embed", embed, methods=["POST"])])
+
+
+class WorkerPool:
+    def __init__(self, count: int, transport: str, base_port: int, env: dict):
+        self.count = count
+        self.transport = transport
+        self.ports = [base_port + i for i in range(count)]
+        self.env = {**os.environ, **env}
+        self.procs = [None] * count
+
+    def _spawn(self, i: int):
+        self.procs[i] = subprocess.Popen(
+            [sys.executable, "server.py", "--transport", self.transport,
+             "--host", "127.0.0.1", "--port", str(self.ports[i])],
+            env={**self.env, "SDF_WORKER_ID": str(i)},
+        )
+
+    def start(self):
+        for i in range(self.count):
+            self._spawn(i)
+
+    async def supervise(self, interval: float = 2.0):
+        while True:
+            await asyncio.sleep(interval)
+            for i, proc in enumerate(self.procs):
+                if proc.poll() is not None:
+                    print(f"[serve] worker {i} exited with {proc.returncode}, restarting", file=sys.stderr)
+                    self._spawn(i)
+
+    def stop(self):
+        for proc in self.procs:
+            if proc and proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs:
+            if proc:
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+
+async def run(args):
+    worker_env = {rag_engine.EMBED_URL_ENV: f"http://127.0.0.1:{args.embed_port}/embed"}
+    if args.index:
+        # Pinned: every worker maps this exact file and never swaps
+        index_path = os.path.abspath(args.index)
+        if args.rebuild or not os.path.exists(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            print(f"[serve] building shared index {index_path}", file=sys.stderr)
+            rag_engine.export_shared_index(index_path, refresh=args.rebuild)
+        worker_env[rag_engine.SHARED_INDEX_ENV] = index_path
+    elif args.rebuild or build_index.current_version() is None:
+        # Versioned artifacts: workers load CURRENT and hot-swap when it changes
+        print("[serve] building index artifact", file=sys.stderr)
+        build_index.build(refresh=args.rebuild, activate=True)
+    # Warm the model before workers start asking for query embeddings
+    rag_engine.get_embedder()
+
+    pool = WorkerPool(args.workers, args.transport, args.worker_port, worker_env)
+    router = AffinityRouter([f"http://127.0.0.1:{port}" for port in pool.ports])
+    servers = [
+        uvicorn.Server(uvicorn.Config(make_router_app(router), host=args.host, port=args.port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(make_embed_app(), host="127.0.0.1", port=args.embed_port, log_level="warning")),
+    ]
+    pool.start()
+    print(f"[serve] {args.workers} {args.transport} workers behind http://{args.host}:{args.port}", file=sys.stderr)
+    supervisor = asyncio.create_task(pool.supervise())
+    try:
+        await asyncio.gather(*(server.serve() for server in servers))
+    finally:
+        supervisor.cancel()
+        pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the MCP server from several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--transport", choices=["streamable-http", "sse"], default="streamable-http")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="public router port")
+    parser.add_argument("--worker-port", type=int, default=8100, help="first worker port (loopback)")
+    parser.add_argument("--embed-port", type=int, default=8099, help="embedding service port (loopback)")
+    parser.add_argument("--index", help="pin workers to this memory-mapped index file instead of "
+                                         "the versioned artifacts from build_index.py")
+    parser.add_argument("--rebuild", action="store_true", help="re-fetch the corpus and rebuild the index")
+    args = parser.parse_args()
+    # Turn SIGTERM into a normal exit so the worker processes are stopped too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
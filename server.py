@@ -1,9 +1,15 @@
 # server.py
+import asyncio
+import json
 import uuid
 from fastmcp import FastMCP, Context
 from memory import ConversationMemory
 from agent import DesignAgent
-from rag_engine import get_snippets
+import rag_engine
+from rag_engine import get_snippets, resolve_topic
+import metrics
+import trace_log
+from scheduler import scheduler, Busy, SAMPLE_TIMEOUT, PRIORITY_IN_PROGRESS, PRIORITY_NEW
 memory = ConversationMemory(max_turns=10)
 agent = DesignAgent(memory)
 CLAUDE_COMMAND = "claude.respond"   # Claude client must listen for this
@@ -15,6 +21,7 @@ mcp = FastMCP("system-design")
     description="role-definition of the MCP server, only used at the beginning of the conversation",
     tags={"background"}
 )
+@trace_log.traced("prompt", "role-definition")
 async def role_definition(ctx: Context) -> str:
     """
     Get the role definition of the MCP server.
@@ -40,6 +47,7 @@ async def role_definition(ctx: Context) -> str:
     description="Evaluate functional and non-functional requirements",
     tags={"evaluation"}
 )
+@trace_log.traced("prompt", "requirements-evaluation")
 async def evaluate_requirements(ctx: Context, system_design: str) -> str:
     return """
     Evaluate {{system-design}} requirements:
@@ -69,6 +77,7 @@ async def evaluate_requirements(ctx: Context, system_design: str) -> str:
     description="Evaluate system core entities and data models",
     tags={"evaluation"}
 )
+@trace_log.traced("prompt", "core-entities-evaluation")
 async def evaluate_core_entities(ctx: Context, system_design: str) -> str:
     return """
     Review the core entities for {{system-design}} considering entity completeness
@@ -87,6 +96,7 @@ async def evaluate_core_entities(ctx: Context, system_design: str) -> str:
     description="Evaluate API design and interfaces",
     tags={"evaluation"}
 )
+@trace_log.traced("prompt", "api-design-evaluation")
 async def evaluate_api_design(ctx: Context, system_design: str) -> str:
     return """
     Analyze the API design for {{system-design}} focusing on:
@@ -109,6 +119,7 @@ async def evaluate_api_design(ctx: Context, system_design: str) -> str:
     description="Evaluate high-level architecture",
     tags={"evaluation"}
 )
+@trace_log.traced("prompt", "architecture-evaluation")
 async def evaluate_architecture(ctx: Context, system_design: str) -> str:
     return """
     Assess the high-level architecture for {{system-design}} considering:
@@ -130,6 +141,7 @@ async def evaluate_architecture(ctx: Context, system_design: str) -> str:
     description="Evaluate detailed technical decisions",
     tags={"evaluation"}
 )
+@trace_log.traced("prompt", "deep-dive-evaluation")
 async def evaluate_deep_dive(ctx: Context, system_design: str) -> str:
     return """
     Deep dive analysis for {{system-design}} focusing on:
@@ -160,6 +172,7 @@ async def evaluate_deep_dive(ctx: Context, system_design: str) -> str:
     description="Provide overall evaluation and grading",
     tags={"evaluation"}
 )
+@trace_log.traced("prompt", "final-evaluation")
 async def final_evaluation(ctx: Context, system_design: str) -> str:
     return """
     Provide comprehensive evaluation for {{system-design}} covering:
@@ -180,6 +193,7 @@ async def final_evaluation(ctx: Context, system_design: str) -> str:
     description="procedure of the system design feedback",
     tags={"procedure"}
 )
+@trace_log.traced("prompt", "system-design-feedback-procedure")
 async def system_design_feedback_procedure(ctx: Context, system_design: str) -> str:
     """
     Get the procedure of an system design interview.
@@ -232,12 +246,17 @@ async def system_design_feedback_procedure(ctx: Context, system_design: str) ->
     """
     
 @mcp.tool()
-async def get_rag_context(user_id: str, system_design: str, ctx: Context) -> str:
+@trace_log.traced("tool")
+async def get_rag_context(user_id: str, system_design: str, ctx: Context, topic: str = "") -> str:
     """
     Get a response from the RAG engine.
     This tool is used to get the response from the RAG engine.
     By using the context from the RAG engine, you should evaluate the system design and provide feedback.
     You are not allowed to disclose your expected output.
+
+    Args:
+        topic: Optional interview topic (e.g. "Design a URL shortener like Bitly"); when it matches
+            a corpus topic, only that topic's breakdown is searched.
     """
     try:
         if not system_design:
@@ -246,13 +265,16 @@ async def get_rag_context(user_id: str, system_design: str, ctx: Context) -> str
         user_id = user_id or str(uuid.uuid4())
         
         # Build prompt with memory + RAG
-        prompt = get_snippets(system_design, 2)
+        with metrics.span("tool.get_rag_context"):
+            slug = resolve_topic(topic) if topic else None
+            prompt = get_snippets(system_design, 2, topic=slug)
         
         return prompt
     except Exception as e:
         return f"Error in get_rag_context: {str(e)}"
 
 @mcp.tool()
+@trace_log.traced("tool")
 async def get_sampling_response(user_id: str, system_design: str, ctx: Context) -> str:
     """
     Check if the system design is valid.
@@ -263,16 +285,25 @@ async def get_sampling_response(user_id: str, system_design: str, ctx: Context)
     if not system_design:
         return {"error": "Missing system_design"}
     
-    response = await ctx.sample(
-        messages = "This is a system design for a chatbot. Please provide feedback in less than 40 words on the design.",
-        system_prompt ="You are a helpful assistant that provides concise feedback on system designs based on the user's input.",
-        temperature=0.7,
-        max_tokens=150
-    )
+    try:
+        async with scheduler.slot(user_id or "anonymous", PRIORITY_NEW):
+            with metrics.span("tool.get_sampling_response"), metrics.span("llm.sample"):
+                response = await asyncio.wait_for(ctx.sample(
+                    messages = "This is a system design for a chatbot. Please provide feedback in less than 40 words on the design.",
+                    system_prompt ="You are a helpful assistant that provides concise feedback on system designs based on the user's input.",
+                    temperature=0.7,
+                    max_tokens=150
+                ), SAMPLE_TIMEOUT)
+    except Busy as e:
+        return e.to_response()
+    except asyncio.TimeoutError:
+        metrics.inc("sampling.sample_timeout")
+        return {"error": "LLM sampling timed out"}
 
     return response.text.strip().lower()
 
 @mcp.tool()
+@trace_log.traced("tool")
 async def design_feedback(user_id: str, system_design: str, ctx: Context) -> dict:
     """
     Get feedback on a system design from Claude.
@@ -288,25 +319,139 @@ async def design_feedback(user_id: str, system_design: str, ctx: Context) -> dic
         return {"error": "Missing system_design"}
 
     user_id = user_id or str(uuid.uuid4())
+    # Interviews already under way are served before new ones
+    priority = PRIORITY_IN_PROGRESS if memory.has_history(user_id) else PRIORITY_NEW
     
-    # Build prompt with memory + RAG
-    prompt = agent.build_prompt(user_id, system_design)
-
-    # Ask Claude client
-    response = await ctx.sample(
-        messages = prompt,
-        system_prompt ="You are a helpful assistant that provides concise feedback on system designs based on the user's input.",
-        temperature=0.7,
-        max_tokens=300
-    )
-    
-    # Process the LLM's response
-    feedback = response.text.strip().lower()
+    with metrics.span("tool.design_feedback"):
+        try:
+            async with scheduler.slot(user_id, priority):
+                # Build prompt with memory + RAG
+                prompt = agent.build_prompt(user_id, system_design)
+
+                # Ask Claude client
+                with metrics.span("llm.sample"):
+                    response = await asyncio.wait_for(ctx.sample(
+                        messages = prompt,
+                        system_prompt ="You are a helpful assistant that provides concise feedback on system designs based on the user's input.",
+                        temperature=0.7,
+                        max_tokens=300
+                    ), SAMPLE_TIMEOUT)
+        except Busy as e:
+            return e.to_response()
+        except asyncio.TimeoutError:
+            metrics.inc("sampling.sample_timeout")
+            return {"error": "LLM sampling timed out"}
+        
+        # Process the LLM's response
+        feedback = response.text.strip().lower()
 
-    # Store into memory
-    memory.add(user_id, "user", system_design)
-    memory.add(user_id, "assistant", feedback)
+        # Store into memory
+        memory.add(user_id, "user", system_design)
+        memory.add(user_id, "assistant", feedback)
     return {"feedback": feedback}
 
+@mcp.tool()
+@trace_log.traced("tool")
+async def score_design(topic: str, phase: str, answer: str) -> dict:
+    """
+    Score a candidate's answer for one interview phase locally, without an LLM call.
+    Compares the answer with the reference breakdown of the same topic and phase.
+
+    Args:
+        topic: System design topic, e.g. "Design a URL shortener like Bitly".
+        phase: Interview phase, e.g. "Requirements" or "api-design-evaluation".
+        answer: The candidate's answer for that phase.
+
+    Returns:
+        dict: score in [0, 1], verdict ("advance", "improve" or "hint"), component
+        scores and the rubric items / key terms the answer is missing.
+    """
+    if not answer:
+        return {"error": "Missing answer"}
+    try:
+        import rubric  # numpy + embedder, loaded on first use to keep startup fast
+        return rubric.score_answer(topic, phase, answer)
+    except Exception as e:
+        return {"error": f"Error in score_design: {str(e)}"}
+
+@mcp.tool()
+@trace_log.traced("tool")
+async def list_index_versions() -> dict:
+    """
+    Admin: list the versioned index artifacts built by build_index.py.
+
+    Returns:
+        dict: the version serving queries in this process, the version named by CURRENT,
+        and a summary of every artifact.
+    """
+    import build_index
+    return {
+        "active": rag_engine.active_index_version,
+        "current": build_index.current_version(),
+        "versions": [
+            {k: m[k] for k in ("version", "created_at", "chunks", "embed_model")}
+            for m in map(build_index.read_manifest, build_index.list_versions())
+        ],
+    }
+
+@mcp.tool()
+@trace_log.traced("tool")
+async def swap_index(version: str = "") -> dict:
+    """
+    Admin: switch to another index artifact without a restart (also used for rollback).
+    The version becomes CURRENT, so every worker watching indexes/ follows within one
+    watch interval. Queries already running finish on the old index.
+
+    Args:
+        version: Artifact version to activate; empty reloads the one named by CURRENT.
+    """
+    try:
+        manifest = rag_engine.activate_index(version or None)
+    except Exception as e:
+        return {"error": f"Error in swap_index: {str(e)}"}
+    return {"active": manifest["version"], "chunks": manifest["chunks"]}
+
+@mcp.resource(
+    "metrics://latency",
+    name="latency-metrics",
+    description="Per-stage latency histograms (p50/p95/p99) and counters as JSON",
+    mime_type="application/json"
+)
+def latency_metrics() -> str:
+    return json.dumps(metrics.snapshot(), indent=2)
+
+@mcp.resource(
+    "metrics://prometheus",
+    name="prometheus-metrics",
+    description="Per-stage latency histograms in Prometheus text exposition format",
+    mime_type="text/plain"
+)
+def prometheus_metrics() -> str:
+    return metrics.to_prometheus()
+
+@mcp.tool()
+@trace_log.traced("tool")
+async def get_metrics(format: str = "json") -> dict | str:
+    """
+    Get the server's per-stage latency metrics.
+
+    Args:
+        format: "json" for a summary with p50/p95/p99 per stage, or "prometheus" for the text exposition format.
+    """
+    if format == "prometheus":
+        return metrics.to_prometheus()
+    return {**metrics.snapshot(), "sampling": scheduler.stats()}
+
 if __name__ == "__main__":
-    mcp.run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="System design feedback MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        mcp.run()
+    else:
+        mcp.run(transport=args.transport, host=args.host, port=args.port)
@@ -0,0 +1,169 @@
+# shared_index.py
+"""
+Read-only vector index stored in one memory-mapped file.
+
+Layout (little endian):
+    header     magic "SDFIDX01", n_chunks, dim, then the offsets/lengths below
+    vectors    float32[n_chunks, dim], rows L2-normalized
+    offsets    uint64[n_chunks + 1], byte offsets of each chunk in `texts`
+    texts      utf-8 chunk texts, back to back
+    metadata   JSON list with one dict per chunk
+
+Every worker maps the same file with ACCESS_READ and builds numpy views on
+top of it, so the matrix and texts live once in the OS page cache no matter
+how many processes serve queries.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b"SDFIDX01"
+_HEADER = struct.Struct("<8sQQQQQQQQ")  # magic, n, dim, vec_off, off_off, text_off, text_len, meta_off, meta_len
+_ALIGN = 64
+
+# Same attribute names as a langchain Document so callers can treat both alike
+Chunk = namedtuple("Chunk", ["page_content", "metadata"])
+
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % _ALIGN))
+
+
+def write_index(path: str, texts: list, vectors, metadatas: list = None):
+    """Write texts + embeddings to `path` atomically (tmp file + rename)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(texts) != len(vectors):
+        raise ValueError("texts and vectors must have the same length")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+    metadatas = metadatas or [{} for _ in texts]
+    encoded = [t.encode("utf-8") for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.uint64)
+    meta_blob = json.dumps(metadatas).encode("utf-8")
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        _pad(f)
+        vec_off = f.tell()
+        f.write(vectors.tobytes())
+        _pad(f)
+        off_off = f.tell()
+        f.write(offsets.tobytes())
+        text_off = f.tell()
+        for b in encoded:
+            f.write(b)
+        text_len = f.tell() - text_off
+        meta_off = f.tell()
+        f.write(meta_blob)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, len(texts), vectors.shape[1] if len(texts) else 0,
+                             vec_off, off_off, text_off, text_len, meta_off, len(meta_blob)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class MmapIndex:
+    """
+    Cosine search over a memory-mapped index file. Exact by default; when an
+    HNSW sidecar (ann_index.py) was built next to the file, queries go
+    through the graph instead.
+    """
+
+    def __init__(self, path: str, use_ann: bool = True, ef_search: int = 64):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, dim, vec_off, off_off, text_off, text_len, meta_off, meta_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared index file")
+        self.size = n
+        self.dim = dim
+        self.vectors = np.frombuffer(self._mm, dtype=np.float32, count=n * dim, offset=vec_off).reshape(n, dim)
+        self._offsets = np.frombuffer(self._mm, dtype=np.uint64, count=n + 1, offset=off_off)
+        self._text_off = text_off
+        # Metadata is small next to the vectors; parse it once per process
+        self.metadatas = json.loads(self._mm[meta_off:meta_off + meta_len].decode("utf-8"))
+        self._topics = np.array([m.get("topic") for m in self.metadatas], dtype=object)
+        self.ann = self._load_ann(ef_search) if use_ann else None
+
+    def _load_ann(self, ef_search: int):
+        # hnswlib cannot map the graph: this reads it, vectors included, into
+        # private memory, so unlike the index file it is not shared between processes
+        from ann_index import HnswIndex, sidecar_path
+
+        if not os.path.exists(sidecar_path(self.path)):
+            return None
+        try:
+            return HnswIndex.load(sidecar_path(self.path), self.dim, ef_search)
+        except ImportError as e:
+            print(f"[index] {e}; using exact search", file=sys.stderr)
+            return None
+
+    def text(self, i: int) -> str:
+        start = self._text_off + int(self._offsets[i])
+        end = self._text_off + int(self._offsets[i + 1])
+        return self._mm[start:end].decode("utf-8")
+
+    def search_by_vector(self, vector, k: int = 4, topic: str = None) -> list:
+        """Return [(index, score)] of the k most similar chunks, optionally within one topic."""
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        if self.ann is not None:
+            topic_filter = None if topic is None else (lambda i: self._topics[i] == topic)
+            try:
+                return self.ann.search(q, k, topic_filter)
+            except RuntimeError:
+                pass  # too few chunks in this topic for the graph search; scan them exactly
+        scores = self.vectors @ q
+        if topic is not None:
+            scores = np.where(self._topics == topic, scores, -np.inf)
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def similarity_search_by_vector(self, vector, k: int = 4, topic: str = None) -> list:
+        return [Chunk(self.text(i), self.metadatas[i]) for i, _ in self.search_by_vector(vector, k, topic)]
+
+    def similarity_search(self, query: str, k: int = 4, topic: str = None) -> list:
+        from rag_engine import get_embedder
+
+        return self.similarity_search_by_vector(get_embedder().embed_query(query), k, topic)
+
+    def close(self):
+        # numpy views pin the buffer; drop them before unmapping
+        self.vectors = None
+        self._offsets = None
+        self._mm.close()
+
+
+class RemoteEmbedder:
+    """
+    Embedder that asks the router process (serve.py) for vectors, so the
+    sentence-transformers model is loaded once instead of once per worker.
+    Same embed_query/embed_documents interface as the langchain embedder.
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        import httpx
+
+        self.url = url
+        self._client = httpx.Client(timeout=timeout)
+
+    def embed_documents(self, texts: list) -> list:
+        response = self._client.post(self.url, json={"texts": texts})
+        response.raise_for_status()
+        return response.json()["vectors"]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,314 @@
+# trace_log.py
+"""
+Request trace log for the MCP server.
+
+Every decorated tool/prompt invocation is appended to a JSONL file with the
+tool name, a hash of its arguments, payload sizes, per-stage timings and
+cache counters. Writes go through a background thread that batches lines
+and rotates the file, so a request never waits on disk.
+
+Captured logs can be replayed against a server to reproduce a load pattern
+(admin tools such as swap_index are skipped):
+
+    python trace_log.py replay logs/requests.jsonl --speed 4
+    python trace_log.py replay logs/requests.jsonl --transport http --url http://127.0.0.1:8000/mcp/
+"""
+import argparse
+import asyncio
+import atexit
+import hashlib
+import inspect
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+import metrics
+
+# Load parameters globally
+with open("parameters.json", "r") as f:
+    _trace_params = json.load(f).get("trace_log", {})
+
+
+class TraceWriter:
+    """
+    Non-blocking JSONL writer. write() only enqueues; a daemon thread drains
+    the queue in batches, flushes every `flush_interval` seconds and rotates
+    the file once it grows past `max_bytes` (path -> path.1 -> ... -> path.N).
+    When the queue is full the record is dropped and counted rather than
+    blocking the caller.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                 batch_size: int = 64, flush_interval: float = 1.0, queue_size: int = 10000):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = threading.Event()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("trace_log.dropped")
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self._file.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch))
+                self._file.flush()
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self._closed.set()
+        self._thread.join(timeout=5)
+        self._file.close()
+
+
+_writer = None
+
+# Arguments that select a code path and carry nothing about the candidate;
+# always recorded verbatim so replay takes the same paths (topic as its slug)
+PLAIN_ARGS = ("phase", "format")
+# Admin/observability tools are left out of replay: they would change the target server's state
+REPLAY_SKIP = {"swap_index", "list_index_versions", "get_metrics"}
+
+
+def get_writer():
+    """Return the process-wide writer, or None when tracing is disabled."""
+    global _writer
+    if _writer is None and _trace_params.get("enabled", False):
+        path = Path(_trace_params.get("path", "logs/requests.jsonl"))
+        # serve.py workers each get their own file so rotation never races
+        worker_id = os.environ.get("SDF_WORKER_ID")
+        if worker_id is not None:
+            path = path.with_name(f"{path.stem}.worker{worker_id}{path.suffix}")
+        _writer = TraceWriter(
+            str(path),
+            max_bytes=_trace_params.get("max_bytes", 10 * 1024 * 1024),
+            backups=_trace_params.get("backups", 5),
+            batch_size=_trace_params.get("batch_size", 64),
+            flush_interval=_trace_params.get("flush_interval", 1.0),
+        )
+        atexit.register(_writer.close)
+    return _writer
+
+
+def _args_hash(args: dict) -> str:
+    canonical = json.dumps(args, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _size(value) -> int:
+    if isinstance(value, str):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+
+def traced(kind: str, name: str = None):
+    """
+    Decorator for MCP tool/prompt functions: records one trace line per call.
+    `name` defaults to the function name, which is what FastMCP registers
+    tools under. The Context argument is left out of the hash and sizes.
+    """
+
+    def decorator(fn):
+        sig = inspect.signature(fn)
+        trace_name = name or fn.__name__
+
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            writer = get_writer()
+            if writer is None:
+                return await fn(*args, **kwargs)
+
+            bound = sig.bind_partial(*args, **kwargs)
+            call_args = {k: v for k, v in bound.arguments.items() if k != "ctx"}
+            started = time.time()
+            start = time.perf_counter()
+            error = None
+            result = None
+            with metrics.collect() as collected:
+                try:
+                    result = await fn(*args, **kwargs)
+                    return result
+                except Exception as e:
+                    error = type(e).__name__
+                    raise
+                finally:
+                    record = {
+                        "ts": round(started, 6),
+                        "kind": kind,
+                        "name": trace_name,
+                        "args_hash": _args_hash(call_args),
+                        "arg_sizes": {k: _size(v) for k, v in call_args.items()},
+                        "response_size": _size(result) if result is not None else 0,
+                        "duration_ms": round(1000 * (time.perf_counter() - start), 3),
+                        "stages_ms": {k: round(1000 * v, 3) for k, v in collected["stages"].items()},
+                        "cache": {k: v for k, v in collected["counters"].items() if "cache" in k},
+                        "error": error,
+                    }
+                    values = {k: call_args[k] for k in PLAIN_ARGS if k in call_args}
+                    if "topic" in call_args:
+                        from rag_engine import resolve_topic
+
+                        values["topic"] = resolve_topic(call_args["topic"]) or ""
+                    if values:
+                        record["values"] = values
+                    if "user_id" in call_args:
+                        # Pseudonymous: lets replay keep one user's calls together without storing the id
+                        record["user"] = _args_hash(call_args["user_id"])
+                    if _trace_params.get("capture_args", False):
+                        record["args"] = call_args
+                    writer.write(record)
+
+        return wrapper
+
+    return decorator
+
+
+def read_trace(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _replay_args(record: dict) -> dict:
+    """
+    Recorded arguments when the log captured them, otherwise filler of the
+    recorded sizes with the plain values (phase, format, topic slug) restored.
+    """
+    if "args" in record:
+        return record["args"]
+    args = {k: "x" * size for k, size in record.get("arg_sizes", {}).items()}
+    args.update(record.get("values", {}))
+    return args
+
+
+async def replay(path: str, transport: str = "stdio", url: str = None, server: str = "server.py",
+                 speed: float = 1.0, llm_latency: float = 0.0) -> dict:
+    """
+    Re-drive a captured trace. speed=1 keeps the recorded inter-arrival gaps,
+    speed=4 plays them four times faster, speed=0 fires as fast as possible.
+    Calls are launched on schedule without waiting for earlier ones, so
+    concurrency matches the original traffic. Over HTTP every recorded user
+    gets its own session, sent with X-User-Id so serve.py spreads them.
+    """
+    from contextlib import AsyncExitStack
+
+    from fastmcp import Client
+    from fastmcp.client.transports import PythonStdioTransport, StreamableHttpTransport
+    from fake_llm import FakeLLM
+    from benchmark import summarize
+
+    llm = FakeLLM(latency=llm_latency)
+    all_records = list(read_trace(path))
+    records = [r for r in all_records if r["name"] not in REPLAY_SKIP]
+    samples, errors = {}, {}
+
+    def make_client(user: str):
+        if transport == "http":
+            headers = {"X-User-Id": user} if user else None
+            return Client(StreamableHttpTransport(url, headers=headers), sampling_handler=llm.sampling_handler)
+        return Client(
+            PythonStdioTransport(script_path=server, cwd=str(Path(server).resolve().parent),
+                                 python_cmd=sys.executable),
+            sampling_handler=llm.sampling_handler,
+        )
+
+    def user_of(record: dict) -> str:
+        # stdio is one server process: a single session carries every call
+        return record.get("user", "") if transport == "http" else ""
+
+    async def fire(client, record: dict):
+        start = time.perf_counter()
+        try:
+            if record["kind"] == "prompt":
+                await client.get_prompt(record["name"], _replay_args(record))
+            else:
+                await client.call_tool(record["name"], _replay_args(record))
+        except Exception:
+            errors[record["name"]] = errors.get(record["name"], 0) + 1
+            return
+        samples.setdefault(record["name"], []).append(time.perf_counter() - start)
+
+    async with AsyncExitStack() as stack:
+        sessions = {}
+        for user in dict.fromkeys(map(user_of, records)):
+            sessions[user] = await stack.enter_async_context(make_client(user))
+        t0 = time.perf_counter()
+        first_ts = records[0]["ts"] if records else 0.0
+        tasks = []
+        for record in records:
+            if speed > 0:
+                delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - t0)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(sessions[user_of(record)], record)))
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - t0
+
+    names = sorted(set(samples) | set(errors))
+    return {
+        "records": len(records),
+        "skipped": len(all_records) - len(records),
+        "duration_s": round(duration, 3),
+        "tools": {n: summarize(samples.get(n, []), errors.get(n, 0), duration) for n in names},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request trace log utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("replay", help="re-drive a captured trace log against a server")
+    rp.add_argument("path")
+    rp.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    rp.add_argument("--url", default="http://127.0.0.1:8000/mcp/")
+    rp.add_argument("--server", default="server.py")
+    rp.add_argument("--speed", type=float, default=1.0, help="time acceleration; 0 = as fast as possible")
+    rp.add_argument("--llm-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        result = asyncio.run(replay(args.path, args.transport, args.url, args.server,
+                                    args.speed, args.llm_latency))
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
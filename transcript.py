@@ -0,0 +1,62 @@
+# transcript.py
+from typing import List
+
+
+def render_message(msg: dict) -> str:
+    if msg["role"] == "interviewer":
+        return f"🤖 **Interviewer:** {msg['content']}\n\n"
+    return f"👤 **You:** {msg['content']}\n\n"
+
+
+class Transcript:
+    """
+    Conversation history that renders incrementally.
+
+    Each message is rendered to Markdown once, when it is appended, and the
+    fragment is cached. render() only joins the fragments of the visible
+    window (the last `window` messages, plus one more window per "show
+    earlier" page), so the cost and size of a refresh stay constant no
+    matter how long the interview runs.
+    """
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self.pages = 1
+        self._messages: List[dict] = []
+        self._fragments: List[str] = []
+
+    def append(self, msg: dict):
+        self._messages.append(msg)
+        self._fragments.append(render_message(msg))
+
+    def clear(self):
+        self._messages.clear()
+        self._fragments.clear()
+        self.pages = 1
+
+    def show_earlier(self):
+        """Extend the visible window by one page of older messages."""
+        if self.hidden_count() > 0:
+            self.pages += 1
+
+    def reset_window(self):
+        self.pages = 1
+
+    def hidden_count(self) -> int:
+        return max(0, len(self._fragments) - self.window * self.pages)
+
+    def render(self) -> str:
+        hidden = self.hidden_count()
+        visible = self._fragments[hidden:]
+        if hidden:
+            return f"*… {hidden} earlier messages hidden*\n\n" + "".join(visible)
+        return "".join(visible)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]